@@ -206,7 +206,7 @@ def build_detailed_itinerary(trip_name: str, package_name: str = None, use_ai_se
         builder = ItineraryBuilder()
         
         # Get the trip document
-        trip = frappe.get_doc("Trip", trip_name)
+        trip = frappe.get_cached_doc("Trip", trip_name)
         trip_data = prepare_trip_data(trip)
         
         # Get or select package
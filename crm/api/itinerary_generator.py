@@ -5,21 +5,82 @@ Matches trips with standard packages and analyzes alignment using AI
 
 import frappe
 from frappe import _
+from frappe.desk.reportview import build_match_conditions
+from frappe.utils import cint, strip_html
+import heapq
 import json
+import logging
+import orjson
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import chain, islice
 from datetime import datetime, timedelta
+from operator import itemgetter
 from typing import Dict, List, Optional, Any, Tuple
 
+from crm.utils import bulk_insert_child_rows, skip_mandatory_for_tables
+
 # Import the LLM utils
-from frappe_ai.utils.llm_utils import analyze_trip_package_alignment
+from frappe_ai.utils.llm_utils import analyze_with_llm
+
+logger = frappe.logger("itinerary", allow_site=True)
+
+by_total_score = itemgetter("total_score")
+by_time = itemgetter("time")
+
+# Best matches at or above this score covering every trip destination skip AI analysis
+CLEAN_MATCH_MIN_SCORE = 85
+
+SCORE_WEIGHTS = {
+    "destination": 30,
+    "dates": 25,
+    "activities": 20,
+    "group_size": 15,
+    "budget": 10
+}
+
+@dataclass(slots=True)
+class CriterionScore:
+    """Weighted score for a single matching criterion."""
+    score: float
+    max_score: float
+    percentage: float
+    group_size: Optional[int] = None
+    
+    @classmethod
+    def build(cls, ratio: float, weight: float, group_size: Optional[int] = None) -> "CriterionScore":
+        return cls(score=ratio * weight, max_score=weight, percentage=ratio * 100, group_size=group_size)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        data = {"score": self.score, "max_score": self.max_score, "percentage": self.percentage}
+        if self.group_size is not None:
+            data["group_size"] = self.group_size
+        return data
+
+@dataclass(slots=True)
+class ScoreBreakdown:
+    """Per-criterion scores of a trip/package pair."""
+    destination: CriterionScore
+    dates: CriterionScore
+    activities: CriterionScore
+    group_size: CriterionScore
+    budget: CriterionScore
+    
+    def items(self) -> List[Tuple[str, CriterionScore]]:
+        return [(criterion, getattr(self, criterion)) for criterion in SCORE_WEIGHTS]
+    
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {criterion: scores.as_dict() for criterion, scores in self.items()}
 
 @frappe.whitelist()
-def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
+def analyze_trip_package_match(trip_name: str, force_ai: bool = False) -> Dict[str, Any]:
     """
     Analyzes a trip against available standard packages and returns the best match
     with AI-powered requirement analysis.
     
     Args:
         trip_name: Name/ID of the Trip document
+        force_ai: Run the AI analysis even when the best match is a clean fit
     
     Returns:
         Dict containing:
@@ -33,7 +94,7 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
         if not trip_name:
             frappe.throw(_("Trip name is required"))
         
-        trip = frappe.get_doc("Trip", trip_name)
+        trip = frappe.get_cached_doc("Trip", trip_name)
         
         # Get all active standard packages
         packages = get_active_packages()
@@ -56,24 +117,24 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
                 "score_breakdown": breakdown
             })
         
-        # Sort by total score (highest first)
-        scored_packages.sort(key=lambda x: x["total_score"], reverse=True)
+        # Only the best match and up to three alternatives are used, so avoid sorting everything
+        top_scored = heapq.nlargest(4, scored_packages, key=by_total_score)
         
         # Log for debugging
         frappe.log_error(
             f"Trip {trip_name} - Top 3 packages:\n" + 
-            "\n".join([f"{i+1}. {p['package'].package_name} - Score: {p['total_score']:.1f} (Dest: {p['score_breakdown']['destination']['percentage']:.0f}%)" 
-                      for i, p in enumerate(scored_packages[:3])]),
+            "\n".join([f"{i+1}. {p['package'].package_name} - Score: {p['total_score']:.1f} (Dest: {p['score_breakdown'].destination.percentage:.0f}%)" 
+                      for i, p in enumerate(top_scored[:3])]),
             "Package Scoring Debug"
         )
         
         # Filter packages that have at least some destination match (if trip has destinations)
         if trip.destination_city and len(trip.destination_city) > 0:
             # Keep only packages with >0% destination match
-            packages_with_dest_match = [p for p in scored_packages if p["score_breakdown"]["destination"]["percentage"] > 0]
+            packages_with_dest_match = [p for p in scored_packages if p["score_breakdown"].destination.percentage > 0]
             
             if packages_with_dest_match:
-                best_match = packages_with_dest_match[0]
+                best_match = max(packages_with_dest_match, key=by_total_score)
             else:
                 # No packages match the destination - this is a critical issue
                 frappe.log_error(
@@ -81,10 +142,10 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
                     "No Destination Match"
                 )
                 # Still select best overall but flag it
-                best_match = scored_packages[0] if scored_packages else None
+                best_match = top_scored[0] if top_scored else None
         else:
             # No destination requirement, use best overall score
-            best_match = scored_packages[0] if scored_packages else None
+            best_match = top_scored[0] if top_scored else None
         
         if not best_match or best_match["total_score"] < 10:  # Minimum threshold
             return {
@@ -92,24 +153,38 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
                 "message": "No suitable package found for the trip requirements",
                 "selected_package": None,
                 "ai_analysis": None,
-                "all_scores": scored_packages[:3] if scored_packages else []
+                "all_scores": [
+                    {**p, "score_breakdown": p["score_breakdown"].as_dict()} for p in top_scored[:3]
+                ]
             }
         
-        # Prepare data for AI analysis
-        trip_data = prepare_trip_data(trip)
-        package_data = prepare_package_data(best_match["package"])
+        # Alternatives are analyzed together with the best match in a single LLM call
+        alternatives = [
+            p for p in top_scored if p is not best_match and p["total_score"] > 10
+        ][:3]
         
-        # Get AI analysis
-        ai_result = analyze_trip_package_alignment(
-            trip_data=trip_data,
-            package_data=package_data
+        # A clean match (high score, every destination covered) gains little from AI analysis
+        skip_ai = (
+            not cint(force_ai)
+            and best_match["total_score"] >= CLEAN_MATCH_MIN_SCORE
+            and best_match["score_breakdown"].destination.percentage == 100
         )
         
+        ai_results = {}
+        if not skip_ai:
+            # Prepare data for AI analysis
+            trip_data = prepare_trip_data(trip)
+            candidates = [best_match, *alternatives]
+            ai_results = analyze_trip_packages_alignment(
+                trip_data=trip_data,
+                packages_data=[prepare_package_data(p["package"]) for p in candidates]
+            )
+        
         # Check if there's a destination mismatch
         has_destination_mismatch = (
             trip.destination_city and 
             len(trip.destination_city) > 0 and 
-            best_match["score_breakdown"]["destination"]["percentage"] == 0
+            best_match["score_breakdown"].destination.percentage == 0
         )
         
         # Format the response
@@ -128,11 +203,8 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
                 "no_of_nights": best_match["package"].no_of_nights if hasattr(best_match["package"], "no_of_nights") else None
             },
             "match_score": best_match["total_score"],
-            "match_score_breakdown": best_match["score_breakdown"],
+            "match_score_breakdown": best_match["score_breakdown"].as_dict(),
             "destination_mismatch_warning": has_destination_mismatch,
-            "ai_analysis": ai_result.get("parsed_content") if ai_result.get("success") else None,
-            "ai_analysis_raw": ai_result.get("content") if not ai_result.get("parsed_content") else None,
-            "ai_error": ai_result.get("error") if not ai_result.get("success") else None,
             "alternative_packages": [
                 {
                     "name": p["package"].name,
@@ -140,14 +212,24 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
                     "score": p["total_score"],
                     "main_gaps": identify_main_gaps(p["score_breakdown"])
                 }
-                for p in scored_packages[1:4] if p["total_score"] > 10
+                for p in alternatives
             ]
         }
         
-        # Add recommendations based on AI analysis
-        if ai_result.get("success") and ai_result.get("parsed_content"):
+        ai_result = ai_results.get(best_match["package"].name, {})
+        
+        # When the analysis is skipped ai_analysis stays None, so callers can tell it did not run
+        response["ai_analysis_skipped"] = skip_ai
+        response["ai_analysis"] = ai_result.get("parsed_content") if ai_result.get("success") else None
+        response["ai_analysis_raw"] = ai_result.get("content") if not ai_result.get("parsed_content") else None
+        response["ai_error"] = ai_result.get("error") if not ai_result.get("success") else None
+        for alternative in response["alternative_packages"]:
+            alternative["ai_analysis"] = ai_results.get(alternative["name"], {}).get("parsed_content")
+        
+        # Add recommendations based on AI analysis, or on the scores alone when it was skipped
+        if skip_ai or (ai_result.get("success") and ai_result.get("parsed_content")):
             response["recommendations"] = format_recommendations(
-                ai_result["parsed_content"],
+                ai_result.get("parsed_content"),
                 best_match["score_breakdown"]
             )
         
@@ -161,6 +243,72 @@ def analyze_trip_package_match(trip_name: str) -> Dict[str, Any]:
             "message": "An error occurred while analyzing the trip"
         }
 
+def _dumps(obj: Any, indent: bool = False) -> str:
+    """Serializes obj to a JSON string with orjson; values orjson can't handle fall back to str."""
+    return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 if indent else None).decode()
+
+def analyze_trip_packages_alignment(trip_data: Dict[str, Any], packages_data: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyzes trip alignment for several candidate packages with a single LLM request.
+    
+    The trip context is sent once and the model returns one analysis per package, so
+    ranking alternatives does not cost an extra round trip each. The same prompt is used
+    however many packages are sent, so every analysis has the same shape.
+    
+    Returns:
+        Dict keyed by package docname, each value holding success, parsed_content, content
+        and error like the single-package analyze_trip_package_alignment result
+    """
+    context = json.dumps({"trip": trip_data, "packages": packages_data}, indent=2, default=str)
+    query = """
+Analyze how well each candidate package aligns with the trip requirements.
+
+Respond with a JSON object keyed by the exact "name" of every package:
+{
+    "<name>": {
+        "alignment_summary": "Short summary of the fit",
+        "matched_requirements": ["..."],
+        "gaps": ["..."],
+        "customization_recommendations": ["..."]
+    }
+}
+"""
+    
+    ai_result = analyze_with_llm(
+        context=context,
+        query=query,
+        system_prompt="You are a travel planning expert comparing standard packages against a customer's trip requirements. Respond with valid JSON only.",
+        model="gpt-4o-mini",
+        json_response=True
+    )
+    
+    if not ai_result.get("success") or not ai_result.get("content"):
+        error = ai_result.get("error") or "Empty response from AI"
+        return {p["name"]: {"success": False, "error": error} for p in packages_data}
+    
+    try:
+        analyses = json.loads(ai_result["content"])
+    except ValueError:
+        analyses = {}
+    
+    results = {}
+    for package_data in packages_data:
+        analysis = analyses.get(package_data["name"]) if isinstance(analyses, dict) else None
+        if isinstance(analysis, dict):
+            results[package_data["name"]] = {
+                "success": True,
+                "parsed_content": analysis,
+                "content": json.dumps(analysis)
+            }
+        else:
+            results[package_data["name"]] = {
+                "success": False,
+                "content": ai_result["content"],
+                "error": "No analysis returned for this package"
+            }
+    
+    return results
+
 def get_active_packages() -> List[frappe._dict]:
     """Fetches all active standard packages."""
     packages = frappe.get_all(
@@ -177,11 +325,18 @@ def get_active_packages() -> List[frappe._dict]:
     
     # Fetch child table data for each package
     for package in packages:
+        # Normalize numeric fields once so scoring does not convert them per trip/package pair
+        package["_base_cost"] = float(package.base_cost) if package.base_cost else (
+            float(package.net_price) if package.get("net_price") else 0.0
+        )
+        package["_min_group_size"] = int(package.min_group_size) if package.min_group_size else 1
+        package["_max_group_size"] = int(package.max_group_size) if package.max_group_size else 999
+        
         # Get destinations child table
         package["destinations"] = frappe.get_all(
             "Trip Destination",
             filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["destination"]
+            pluck="destination"
         )
         
         # Debug logging for Singapore package
@@ -195,101 +350,40 @@ def get_active_packages() -> List[frappe._dict]:
         package["activities"] = frappe.get_all(
             "Activity Child Table",
             filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["activity"]
-        )
-        
-        # Get package inclusions child table
-        package["package_inclusions"] = frappe.get_all(
-            "Package Inclusion Child Table",
-            filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["*"]
-        )
-        
-        # Get package exclusions child table
-        package["package_exclusions"] = frappe.get_all(
-            "Package Exclusion Child Table",
-            filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["*"]
-        )
-        
-        # Get target audience child table
-        package["target_audience"] = frappe.get_all(
-            "Target Audience Child Table",
-            filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["*"]
-        )
-        
-        # Get exclusion criteria child table
-        package["exclusion_criteria"] = frappe.get_all(
-            "Exclusion Criteria Child Table",
-            filters={"parent": package.name, "parenttype": "Standard Package"},
-            fields=["*"]
+            pluck="activity"
         )
     
     return packages
 
-def calculate_package_score(trip: Any, package: frappe._dict) -> Tuple[float, Dict[str, Any]]:
+def calculate_package_score(trip: Any, package: frappe._dict) -> Tuple[float, "ScoreBreakdown"]:
     """
     Calculates a matching score between a trip and a package.
     
     Returns:
         Tuple of (total_score, score_breakdown)
     """
-    score_breakdown = {}
-    weights = {
-        "destination": 30,
-        "dates": 25,
-        "activities": 20,
-        "group_size": 15,
-        "budget": 10
-    }
-    
     # Calculate group size from passenger_details
     group_size = len(trip.passenger_details) if trip.passenger_details else (trip.pax if trip.pax else 0)
     
-    # 1. Destination Match (30 points)
-    destination_score = calculate_destination_match(trip, package)
-    score_breakdown["destination"] = {
-        "score": destination_score * weights["destination"],
-        "max_score": weights["destination"],
-        "percentage": destination_score * 100
-    }
-    
-    # 2. Date Compatibility (25 points)
-    date_score = calculate_date_compatibility(trip, package)
-    score_breakdown["dates"] = {
-        "score": date_score * weights["dates"],
-        "max_score": weights["dates"],
-        "percentage": date_score * 100
-    }
-    
-    # 3. Activity Match (20 points)
-    activity_score = calculate_activity_match(trip, package)
-    score_breakdown["activities"] = {
-        "score": activity_score * weights["activities"],
-        "max_score": weights["activities"],
-        "percentage": activity_score * 100
-    }
-    
-    # 4. Group Size Compatibility (15 points)
-    group_score = calculate_group_size_compatibility(trip, package, group_size)
-    score_breakdown["group_size"] = {
-        "score": group_score * weights["group_size"],
-        "max_score": weights["group_size"],
-        "percentage": group_score * 100,
-        "group_size": group_size
-    }
-    
-    # 5. Budget Alignment (10 points)
-    budget_score = calculate_budget_alignment(trip, package, group_size)
-    score_breakdown["budget"] = {
-        "score": budget_score * weights["budget"],
-        "max_score": weights["budget"],
-        "percentage": budget_score * 100
-    }
+    score_breakdown = ScoreBreakdown(
+        # 1. Destination Match (30 points)
+        destination=CriterionScore.build(calculate_destination_match(trip, package), SCORE_WEIGHTS["destination"]),
+        # 2. Date Compatibility (25 points)
+        dates=CriterionScore.build(calculate_date_compatibility(trip, package), SCORE_WEIGHTS["dates"]),
+        # 3. Activity Match (20 points)
+        activities=CriterionScore.build(calculate_activity_match(trip, package), SCORE_WEIGHTS["activities"]),
+        # 4. Group Size Compatibility (15 points)
+        group_size=CriterionScore.build(
+            calculate_group_size_compatibility(trip, package, group_size),
+            SCORE_WEIGHTS["group_size"],
+            group_size=group_size
+        ),
+        # 5. Budget Alignment (10 points)
+        budget=CriterionScore.build(calculate_budget_alignment(trip, package, group_size), SCORE_WEIGHTS["budget"])
+    )
     
     # Calculate total score
-    total_score = sum(item["score"] for item in score_breakdown.values())
+    total_score = sum(item.score for _, item in score_breakdown.items())
     
     return total_score, score_breakdown
 
@@ -308,16 +402,18 @@ def calculate_destination_match(trip: Any, package: frappe._dict) -> float:
     if not trip_destinations:
         return 0
     
-    # Parse package destinations
-    package_destinations = []
+    # Parse package destinations (a set, since it is only used for membership checks)
+    package_destinations = set()
     
-    # Get from destinations field (already fetched as list)
+    # Get from destinations field (already fetched as list of names)
     if package.get("destinations"):
         for dest in package["destinations"]:
-            if isinstance(dest, dict):
-                package_destinations.append(dest.get("destination", "").lower())
+            if isinstance(dest, str):
+                package_destinations.add(dest.lower())
+            elif isinstance(dest, dict):
+                package_destinations.add(dest.get("destination", "").lower())
             elif hasattr(dest, 'destination'):
-                package_destinations.append(dest.destination.lower())
+                package_destinations.add(dest.destination.lower())
     
     # Also check itinerary_data for destinations
     if package.get("itinerary_data"):
@@ -326,7 +422,7 @@ def calculate_destination_match(trip: Any, package: frappe._dict) -> float:
             if isinstance(itinerary, list):
                 for day in itinerary:
                     if isinstance(day, dict) and day.get("destination"):
-                        package_destinations.append(day["destination"].lower())
+                        package_destinations.add(day["destination"].lower())
         except:
             pass
     
@@ -404,7 +500,7 @@ def calculate_activity_match(trip: Any, package: frappe._dict) -> float:
     if not trip_activities:
         return 0.5
     
-    package_activities = []
+    package_activities = set()
     
     # Parse activities from itinerary_data JSON
     if package.itinerary_data:
@@ -418,35 +514,37 @@ def calculate_activity_match(trip: Any, package: frappe._dict) -> float:
                             if isinstance(day["activities"], list):
                                 for act in day["activities"]:
                                     if isinstance(act, str):
-                                        package_activities.append(act.lower())
+                                        package_activities.add(act.lower())
                                     elif isinstance(act, dict) and act.get("name"):
-                                        package_activities.append(act["name"].lower())
+                                        package_activities.add(act["name"].lower())
                         # Also check description for activity mentions
                         if day.get("description"):
                             desc = day["description"].lower()
-                            package_activities.append(desc)
+                            package_activities.add(desc)
                         # Check for activity field directly
                         if day.get("activity"):
-                            package_activities.append(day["activity"].lower())
+                            package_activities.add(day["activity"].lower())
         except:
             pass
     
     # Also check the activities child table if it exists
     if package.activities:
         for activity in package.activities:
-            if isinstance(activity, dict):
-                package_activities.append(activity.get("activity", "").lower())
+            if isinstance(activity, str):
+                package_activities.add(activity.lower())
+            elif isinstance(activity, dict):
+                package_activities.add(activity.get("activity", "").lower())
     
     if not package_activities:
         return 0  # No activities found in package
     
-    # Calculate match percentage - check if trip activity is mentioned anywhere
-    matches = 0
-    for trip_act in trip_activities:
-        for pack_act in package_activities:
-            if trip_act in pack_act or pack_act in trip_act:
-                matches += 1
-                break  # Count each trip activity only once
+    # Calculate match percentage - check if trip activity is mentioned anywhere,
+    # trying an exact set lookup before falling back to substring matching
+    matches = sum(
+        1 for trip_act in trip_activities
+        if trip_act in package_activities
+        or any(trip_act in pack_act or pack_act in trip_act for pack_act in package_activities)
+    )
     
     return matches / len(trip_activities) if trip_activities else 0
 
@@ -455,8 +553,8 @@ def calculate_group_size_compatibility(trip: Any, package: frappe._dict, group_s
     if group_size == 0:
         return 0.5  # Neutral if no group size specified
     
-    min_size = int(package.min_group_size) if package.min_group_size else 1
-    max_size = int(package.max_group_size) if package.max_group_size else 999
+    min_size = package._min_group_size
+    max_size = package._max_group_size
     
     if min_size <= group_size <= max_size:
         return 1.0
@@ -484,8 +582,8 @@ def calculate_budget_alignment(trip: Any, package: frappe._dict, group_size: int
     if not trip.budget:
         return 0.5  # Neutral if budget not specified
     
-    # Use base_cost if available, otherwise use net_price
-    package_price_per_pax = float(package.base_cost) if package.base_cost else (float(package.net_price) if package.net_price else 0)
+    # base_cost (falling back to net_price), normalized in get_active_packages
+    package_price_per_pax = package._base_cost
     
     if not package_price_per_pax:
         return 0.5  # Neutral if no price specified
@@ -571,53 +669,76 @@ def prepare_trip_data(trip: Any) -> Dict[str, Any]:
     return data
 
 def prepare_package_data(package: frappe._dict) -> Dict[str, Any]:
-    """Prepares package data for AI analysis."""
+    """
+    Prepares package data for AI analysis.
+    
+    Only fields the alignment prompt reasons about are included; inclusions, exclusions and
+    audience rows are fetched here since they are only needed for the few analyzed candidates.
+    """
+    details = frappe.db.get_value(
+        "Standard Package", package.name, ["package_inclusions", "package_exclusions"], as_dict=True
+    ) or {}
+    
     data = {
+        "name": package.name,
         "package_name": package.package_name,
-        "package_code": package.package_code,
         "description": package.description,
         "valid_from": str(package.valid_from) if package.valid_from else None,
         "valid_to": str(package.valid_to) if package.valid_to else None,
         "min_group_size": package.min_group_size,
         "max_group_size": package.max_group_size,
-        "net_price": package.get("net_price"),  # Handle missing field
+        "no_of_days": package.get("no_of_days"),
         "currency": package.currency,
-        "dmc": package.dmc,
         "base_cost": package.get("base_cost"),
-        "markup_percentage": package.get("markup_percentage")
+        "destinations": package.get("destinations", []),
+        "activities": package.get("activities", []),
+        "package_inclusions": strip_html(details.get("package_inclusions") or ""),
+        "package_exclusions": strip_html(details.get("package_exclusions") or ""),
+        "target_audience": frappe.get_all(
+            "Target Audience Child Table",
+            filters={"parent": package.name, "parenttype": "Standard Package", "parentfield": "target_audience"},
+            pluck="target_audience"
+        ),
+        "exclusion_criteria": frappe.get_all(
+            "Exclusion Criteria Child Table",
+            filters={"parent": package.name, "parenttype": "Standard Package", "parentfield": "exclusion_criteria"},
+            pluck="target_audience"
+        )
     }
     
-    # Handle child tables (already fetched as lists)
-    data["destinations"] = package.get("destinations", [])
-    data["activities"] = package.get("activities", [])
-    data["package_inclusions"] = package.get("package_inclusions", [])
-    data["package_exclusions"] = package.get("package_exclusions", [])
-    data["target_audience"] = package.get("target_audience", [])
-    data["exclusion_criteria"] = package.get("exclusion_criteria", [])
-    
-    # Parse JSON fields (only itinerary_data is JSON)
-    if package.get("itinerary_data"):
-        if isinstance(package.itinerary_data, str):
-            try:
-                data["itinerary_data"] = json.loads(package.itinerary_data)
-            except:
-                data["itinerary_data"] = package.itinerary_data
-        else:
-            data["itinerary_data"] = package.itinerary_data
-    else:
-        data["itinerary_data"] = []
+    # Parse JSON fields (only itinerary_data is JSON) and keep a day-by-day summary
+    itinerary = package.get("itinerary_data") or []
+    if isinstance(itinerary, str):
+        try:
+            itinerary = json.loads(itinerary)
+        except ValueError:
+            itinerary = []
+    data["itinerary_data"] = [
+        _summarize_itinerary_day(day) for day in itinerary if isinstance(day, dict)
+    ] if isinstance(itinerary, list) else []
     
     return data
 
-def identify_main_gaps(score_breakdown: Dict[str, Any]) -> List[str]:
+def _summarize_itinerary_day(day: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduces a package itinerary day to the fields used in the AI prompt."""
+    summary = {key: day[key] for key in ("day", "title", "destination", "description", "activity") if day.get(key)}
+    if isinstance(day.get("activities"), list):
+        summary["activities"] = [
+            act if isinstance(act, str) else act.get("name")
+            for act in day["activities"]
+            if isinstance(act, str) or (isinstance(act, dict) and act.get("name"))
+        ]
+    return summary
+
+def identify_main_gaps(score_breakdown: ScoreBreakdown) -> List[str]:
     """Identifies main gaps based on score breakdown."""
     gaps = []
     for criterion, scores in score_breakdown.items():
-        if scores["percentage"] < 50:
-            gaps.append(f"{criterion}: {scores['percentage']:.0f}% match")
+        if scores.percentage < 50:
+            gaps.append(f"{criterion}: {scores.percentage:.0f}% match")
     return gaps
 
-def format_recommendations(ai_analysis: Dict[str, Any], score_breakdown: Dict[str, Any]) -> List[str]:
+def format_recommendations(ai_analysis: Dict[str, Any], score_breakdown: ScoreBreakdown) -> List[str]:
     """Formats recommendations based on AI analysis and scores."""
     recommendations = []
     
@@ -627,7 +748,7 @@ def format_recommendations(ai_analysis: Dict[str, Any], score_breakdown: Dict[st
     
     # Add score-based recommendations
     for criterion, scores in score_breakdown.items():
-        if scores["percentage"] < 30:
+        if scores.percentage < 30:
             if criterion == "destination":
                 recommendations.append(f"Consider adding more destinations to match the trip requirements")
             elif criterion == "dates":
@@ -660,93 +781,41 @@ def build_detailed_itinerary(trip_name: str, fill_itinerary: bool = True, use_ai
     Returns:
         Dict containing package analysis + created Itinerary record
     """
-    
-    print(f"\n🚀 =============================================================")
-    print(f"🚀 STARTING ENHANCED ITINERARY GENERATOR")
-    print(f"🚀 Trip: {trip_name}")
-    print(f"🚀 Fill Itinerary: {fill_itinerary}")  
-    print(f"🚀 Use AI: {use_ai_selection}")
-    print(f"🚀 =============================================================")
-    
     try:
         # Step 1: Get package matching analysis
-        print(f"\n📊 STEP 1: Analyzing package match for trip {trip_name}")
         match_result = analyze_trip_package_match(trip_name)
         
-        print(f"✅ Package analysis completed:")
-        print(f"   - Success: {match_result.get('success')}")
-        if match_result.get('success'):
-            pkg = match_result["selected_package"]
-            print(f"   - Selected Package: {pkg['package_name']} (ID: {pkg['name']})")
-            print(f"   - Match Score: {match_result['match_score']:.1f}%")
-        else:
-            print(f"   - Error: {match_result.get('message')}")
-            
-        if not match_result["success"]:
-            print(f"❌ Cannot proceed without successful package match")
-            return match_result
-            
-        if not fill_itinerary:
-            print(f"ℹ️ fill_itinerary=False, returning package analysis only")
+        if not match_result["success"] or not fill_itinerary:
             return match_result
         
-        # Step 2: Load trip and package data  
-        print(f"\n📋 STEP 2: Loading trip and package data")
-        trip = frappe.get_doc("Trip", trip_name)
+        # Step 2: Load trip and package data
+        trip = frappe.get_cached_doc("Trip", trip_name)
         selected_package = match_result["selected_package"]
         
-        print(f"✅ Trip loaded: {trip.title}")
-        print(f"   - Customer: {trip.customer}")
-        print(f"   - Budget: {trip.budget}")
-        print(f"   - PAX: {trip.pax}")
-        
         # Get destinations from trip
         destinations = []
         if trip.destination_city:
             destinations = [dest.destination for dest in trip.destination_city if hasattr(dest, 'destination')]
-        print(f"   - Destinations: {destinations}")
         
         if not destinations:
-            error_msg = "No destinations specified in trip"
-            print(f"❌ {error_msg}")
-            match_result["itinerary_error"] = error_msg
+            match_result["itinerary_error"] = "No destinations specified in trip"
             return match_result
         
         # Step 3: Build detailed itinerary with service selection
-        print(f"\n🏗️ STEP 3: Building detailed itinerary with service selection")
-        print(f"   - Using {'AI-powered' if use_ai_selection else 'rule-based'} selection")
-        
         itinerary_result = _build_itinerary_with_services(
             trip, selected_package, destinations, use_ai_selection
         )
         
-        print(f"✅ Service selection completed:")
-        services = itinerary_result.get("services", {})
-        for service_type, service_list in services.items():
-            print(f"   - {service_type.title()}: {len(service_list)} selected")
-            if service_list:
-                print(f"     {service_list[:3]}")  # Show first 3
-        
-        cost = itinerary_result.get("cost_breakdown", {})
-        print(f"   - Total Cost: {cost.get('total', 0):.2f}")
-        
         # Step 4: Create actual Itinerary doctype record
-        print(f"\n💾 STEP 4: Creating Itinerary doctype record")
-        
         itinerary_doc = _create_itinerary_doctype(
             trip=trip,
+            destinations=destinations,
             package_info=selected_package,
             itinerary_data=itinerary_result,
             match_result=match_result
         )
         
-        print(f"✅ Itinerary record created: {itinerary_doc.name}")
-        print(f"   - Name: {itinerary_doc.itinerary_name}")
-        print(f"   - Code: {itinerary_doc.itinerary_code}")
-        print(f"   - Status: {itinerary_doc.status}")
-        
         # Step 5: Update response
-        print(f"\n📤 STEP 5: Preparing final response")
         match_result.update({
             "itinerary_created": True,
             "itinerary_name": itinerary_doc.name,
@@ -759,33 +828,28 @@ def build_detailed_itinerary(trip_name: str, fill_itinerary: bool = True, use_ai
             "service_recommendations": itinerary_result.get("recommendations", [])
         })
         
-        print(f"\n🎉 =============================================================")
-        print(f"🎉 ITINERARY GENERATION COMPLETED SUCCESSFULLY!")
-        print(f"🎉 Created Itinerary: {itinerary_doc.name}")
-        print(f"🎉 Total Services: {sum(len(v) for v in services.values())}")
-        print(f"🎉 Total Cost: {cost.get('total', 0):.2f}")
-        print(f"🎉 =============================================================")
+        logger.info({
+            "event": "itinerary_generated",
+            "trip": trip_name,
+            "package": selected_package["name"],
+            "match_score": match_result.get("match_score"),
+            "itinerary": itinerary_doc.name,
+            "services": {k: len(v) for k, v in itinerary_result.get("services", {}).items()},
+            "total_cost": itinerary_result.get("cost_breakdown", {}).get("total", 0)
+        })
         
         return match_result
         
     except Exception as e:
-        error_msg = f"Error in build_detailed_itinerary: {str(e)}"
-        print(f"\n❌ FATAL ERROR: {error_msg}")
-        frappe.log_error(error_msg, "Enhanced Itinerary Generator")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        frappe.log_error(title="Enhanced Itinerary Generator")
         return {
             "success": False,
             "error": str(e),
             "message": "An error occurred while building the detailed itinerary"
         }
 
-def _create_itinerary_doctype(trip, package_info: Dict, itinerary_data: Dict, match_result: Dict) -> Any:
-    """Create actual Itinerary doctype record"""
-    
-    print(f"\n📝 Creating Itinerary doctype with the following data:")
-    print(f"   - Trip: {trip.name}")
-    print(f"   - Package: {package_info['name']}")
+def _create_itinerary_doctype(trip, destinations: List[str], package_info: Dict, itinerary_data: Dict, match_result: Dict) -> Any:
+    """Create actual Itinerary doctype record for the trip's destination names, in order"""
     
     try:
         # Create new Itinerary document
@@ -794,9 +858,16 @@ def _create_itinerary_doctype(trip, package_info: Dict, itinerary_data: Dict, ma
         # Basic info
         itinerary.trip = trip.name
         itinerary.package = package_info['name']
-        # Create unique itinerary name and code with incremental numbering
-        existing_count = frappe.db.count("Itinerary", {"trip": trip.name})
-        itinerary_number = existing_count + 1
+        # Create unique itinerary name and code with incremental numbering, continuing
+        # from the highest existing code so deleted itineraries do not cause duplicates
+        itinerary_number = cint(frappe.db.sql(
+            """
+            SELECT COALESCE(MAX(CAST(SUBSTRING_INDEX(itinerary_code, '-', -1) AS UNSIGNED)), 0) + 1
+            FROM `tabItinerary`
+            WHERE trip = %s
+            """,
+            trip.name
+        )[0][0])
         
         itinerary.itinerary_name = f"{trip.title} - Itinerary {itinerary_number}"
         itinerary.itinerary_code = f"{trip.name}-ITIN-{itinerary_number:02d}"
@@ -817,173 +888,208 @@ def _create_itinerary_doctype(trip, package_info: Dict, itinerary_data: Dict, ma
         itinerary.max_group_size = trip.pax or 10
         
         # Add destinations with nights calculation
-        print(f"   - Adding destinations...")
         total_nights = (trip.end_date - trip.start_date).days if trip.end_date and trip.start_date else 3
-        nights_per_dest = max(1, total_nights // len(trip.destination_city)) if trip.destination_city else 1
+        nights_per_dest = max(1, total_nights // len(destinations)) if destinations else 1
         
-        for i, dest in enumerate(trip.destination_city):
-            # For the last destination, give it any remaining nights
-            nights = nights_per_dest
-            if i == len(trip.destination_city) - 1:
-                nights = total_nights - (nights_per_dest * i)
-            
-            itinerary.append("destinations", {
-                "destination": dest.destination,
-                "nights": nights,
-                "sequence": i + 1
-            })
-            print(f"     * {dest.destination}: {nights} nights")
+        # Even split, with any remaining nights going to the last destination
+        nights_allocation = [nights_per_dest] * len(destinations)
+        if destinations:
+            nights_allocation[-1] = total_nights - nights_per_dest * (len(destinations) - 1)
         
         # Store detailed itinerary data as JSON
-        print(f"   - Storing itinerary data as JSON...")
-        itinerary.itinerary_data = json.dumps(itinerary_data['itinerary'])
+        itinerary.itinerary_data = _dumps(itinerary_data['itinerary'])
         
         # Add notes with service details
         services = itinerary_data.get('services', {})
-        notes = [
-            f"AI-Generated Itinerary",
-            f"Base Package: {package_info['package_name']}",
-            f"Match Score: {match_result.get('match_score', 0):.1f}%",
-            "",
-            "Selected Services:",
-        ]
-        
-        for service_type, service_list in services.items():
-            notes.append(f"- {service_type.title()}: {len(service_list)} items")
-            for service in service_list[:3]:  # Show first 3
-                notes.append(f"  * {service}")
-            if len(service_list) > 3:
-                notes.append(f"  * ... and {len(service_list)-3} more")
-        
-        if itinerary_data.get('ai_reasoning'):
-            notes.extend([
+        reasoning = itinerary_data.get('ai_reasoning')
+        itinerary.notes = "\n".join(chain(
+            (
+                "AI-Generated Itinerary",
+                f"Base Package: {package_info['package_name']}",
+                f"Match Score: {match_result.get('match_score', 0):.1f}%",
                 "",
-                "AI Selection Reasoning:",
-                itinerary_data['ai_reasoning'][:500] + "..." if len(itinerary_data['ai_reasoning']) > 500 else itinerary_data['ai_reasoning']
-            ])
-        
-        itinerary.notes = "\n".join(notes)
-        
-        # Save the document
-        print(f"   - Saving Itinerary document...")
+                "Selected Services:"
+            ),
+            chain.from_iterable(
+                _service_note_lines(service_type, service_list)
+                for service_type, service_list in services.items()
+            ),
+            ("", "AI Selection Reasoning:", reasoning[:500] + "..." if len(reasoning) > 500 else reasoning)
+            if reasoning else ()
+        ))
+        
+        # Save the document; destination rows are written in one multi-row INSERT below,
+        # so only the destinations table is exempt from the mandatory check
+        destination_rows = [
+            {"destination": destination, "nights": nights, "sequence": i + 1}
+            for i, (destination, nights) in enumerate(zip(destinations, nights_allocation))
+        ]
+        skip_mandatory_for_tables(itinerary, ["destinations"] if destination_rows else [])
         itinerary.insert()
+        itinerary.set("destinations", bulk_insert_child_rows(itinerary, "destinations", destination_rows))
         
-        print(f"✅ Itinerary doctype created successfully:")
-        print(f"   - ID: {itinerary.name}")
-        print(f"   - Name: {itinerary.itinerary_name}")
-        print(f"   - Cost: {itinerary.currency} {itinerary.base_cost}")
+        logger.debug(
+            "Itinerary %s created for trip %s (%s %s)",
+            itinerary.name, trip.name, itinerary.currency, itinerary.base_cost
+        )
         
         frappe.db.commit()
         return itinerary
         
     except Exception as e:
         error_msg = f"Failed to create Itinerary doctype: {str(e)}"
-        print(f"❌ {error_msg}")
-        import traceback
-        print(f"❌ Traceback: {traceback.format_exc()}")
+        frappe.log_error(title="Itinerary Creation Failed")
         raise Exception(error_msg)
 
+def _service_note_lines(service_type: str, service_list: List[str]):
+    """Yields the itinerary note lines for one service type, listing the first 3 services."""
+    yield f"- {service_type.title()}: {len(service_list)} items"
+    yield from (f"  * {service}" for service in islice(service_list, 3))
+    if len(service_list) > 3:
+        yield f"  * ... and {len(service_list)-3} more"
+
+# Service catalog lookups.
+# Service type -> (doctype, fields, available status, city field, max results per destination)
+SERVICE_SOURCES = {
+    "hotels": ("Hotel", ("name", "hotel_name", "star_rating", "city", "currency"), "Active", "city", 10),
+    "activities": ("Activity", (
+        "name", "activity_name", "activity_type", "city", "adult_price", "currency", "duration_hours"
+    ), "Active", "city", 20),
+    "meals": ("Meal", ("name", "meal_name", "meal_type", "city", "adult_price", "currency"), "Active", "city", 15),
+    "transportation": ("Transportation", (
+        "name", "transportation_name", "service_class", "arrival_city", "adult_price", "currency"
+    ), "Confirmed", "arrival_city", 10),
+    "transfers": ("Transfer", (
+        "name", "transfer_name", "transfer_type", "pickup_city", "base_price", "currency"
+    ), "Confirmed", "pickup_city", 10)
+}
+
+# Hotel has no base price field, so a default is derived from the star rating ("4 Star" -> 150)
+HOTEL_STAR_PRICES = {"5": 250, "4": 150, "3": 100, "2": 75, "1": 50}
+
+def _fetch_services(service_type: str, cities: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Fetches the available services of a type for several cities with one query. ROW_NUMBER
+    keeps the most recently modified rows up to the per-destination limit in each city, and
+    the read permission and match conditions get_list would apply are added to the query.
+    """
+    doctype, fields, status, city_field, limit = SERVICE_SOURCES[service_type]
+    frappe.has_permission(doctype, "read", throw=True)
+    
+    conditions = [f"`{city_field}` IN %(cities)s", "status = %(status)s"]
+    match_conditions = build_match_conditions(doctype)
+    if match_conditions:
+        conditions.append(f"({match_conditions})")
+    
+    columns = ", ".join(f"`{field}`" for field in fields)
+    rows = frappe.db.sql(f"""
+        SELECT {columns} FROM (
+            SELECT {columns},
+                ROW_NUMBER() OVER (PARTITION BY `{city_field}` ORDER BY modified DESC) AS row_num
+            FROM `tab{doctype}`
+            WHERE {" AND ".join(conditions)}
+        ) ranked
+        WHERE row_num <= %(limit)s
+        ORDER BY row_num
+    """, {"cities": tuple(cities), "status": status, "limit": limit}, as_dict=True)
+    
+    # City matching follows the column collation, so rows are grouped under the requested spelling
+    requested = {city.lower(): city for city in cities}
+    services_by_city = {city: [] for city in cities}
+    for row in rows:
+        if doctype == "Hotel":
+            row["base_price"] = HOTEL_STAR_PRICES.get((row.star_rating or "").split(" ")[0], 100)
+        city = requested.get((row[city_field] or "").lower())
+        if city:
+            services_by_city[city].append(row)
+    return services_by_city
+
+# Service fields the itinerary prompt needs: the id, a display name, city, price and selection hints
+SERVICE_CONTEXT_FIELDS = {
+    "hotels": ("name", "hotel_name", "star_rating", "city", "base_price"),
+    "activities": ("name", "activity_name", "city", "adult_price", "duration_hours"),
+    "meals": ("name", "meal_name", "meal_type", "city", "adult_price"),
+    "transportation": ("name", "transportation_name", "arrival_city", "adult_price"),
+    "transfers": ("name", "transfer_name", "pickup_city", "base_price")
+}
+
+SERVICE_CACHE_KEY = "itinerary_services"
+SERVICE_CACHE_TTL = 60  # seconds
+
+def _get_services_by_city(service_type: str, cities: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Returns the available services of a type grouped by city. Results are cached per user
+    and city for a short while, so repeated itinerary generation does not re-query the
+    catalog. The rows are filtered by the user's permissions, so they are never shared
+    between users.
+    """
+    cache = frappe.cache()
+    key_prefix = f"{SERVICE_CACHE_KEY}:{frappe.session.user}:{service_type}"
+    
+    services_by_city = {}
+    missing = []
+    for city in dict.fromkeys(cities):
+        cached = cache.get_value(f"{key_prefix}:{city}")
+        if cached is None:
+            missing.append(city)
+        else:
+            services_by_city[city] = cached
+    
+    if missing:
+        for city, services in _fetch_services(service_type, missing).items():
+            services_by_city[city] = services
+            cache.set_value(f"{key_prefix}:{city}", services, expires_in_sec=SERVICE_CACHE_TTL)
+    
+    return services_by_city
+
+def _get_service_cities() -> set:
+    """
+    Returns the cities that have at least one available service of any type. Cached
+    alongside the per-city lookups, so cities without a catalog skip every query.
+    """
+    cache_key = f"{SERVICE_CACHE_KEY}:cities"
+    cities = frappe.cache().get_value(cache_key)
+    if cities is None:
+        cities = frappe.db.sql_list(
+            """
+            SELECT city FROM `tabHotel` WHERE status = 'Active'
+            UNION SELECT city FROM `tabActivity` WHERE status = 'Active'
+            UNION SELECT city FROM `tabMeal` WHERE status = 'Active'
+            UNION SELECT arrival_city FROM `tabTransportation` WHERE status = 'Confirmed'
+            UNION SELECT pickup_city FROM `tabTransfer` WHERE status = 'Confirmed'
+            """
+        )
+        frappe.cache().set_value(cache_key, cities, expires_in_sec=SERVICE_CACHE_TTL)
+    return set(cities)
+
+def clear_service_cache(doc=None, method=None):
+    """Clears cached service catalog lookups; hooked to service doctype updates."""
+    frappe.cache().delete_keys(SERVICE_CACHE_KEY)
+
 def _build_itinerary_with_services(trip: Any, selected_package: Dict, destinations: List[str], use_ai: bool) -> Dict:
     """Build itinerary using actual Hotels, Activities, Meals, Transportation, Transfer services"""
     
-    print(f"\n🔍 Collecting available services for destinations: {destinations}")
-    
-    # Service selection functions with logging
-    def get_hotels(city: str = None, star_rating: str = None, limit: int = 10):
-        filters = {"status": "Active"}
-        if city:
-            filters["city"] = city
-        if star_rating:
-            filters["star_rating"] = star_rating
-        
-        print(f"🏨 Searching hotels: {filters}")
-        results = frappe.get_list("Hotel", fields=[
-            "name", "hotel_name", "star_rating", "city", "currency"
-        ], filters=filters, limit=limit)
-        # Add default base_price if not present
-        for hotel in results:
-            if "base_price" not in hotel:
-                # Assign default price based on star rating
-                star_prices = {"5": 250, "4": 150, "3": 100, "2": 75, "1": 50}
-                hotel["base_price"] = star_prices.get(hotel.get("star_rating", "3"), 100)
-        print(f"   Found {len(results)} hotels")
-        return results
-    
-    def get_activities(city: str = None, limit: int = 20):
-        filters = {"status": "Active"}
-        if city:
-            filters["city"] = city
-        
-        print(f"🎯 Searching activities: {filters}")
-        results = frappe.get_list("Activity", fields=[
-            "name", "activity_name", "activity_type", "city", "adult_price", "currency", "duration_hours"
-        ], filters=filters, limit=limit)
-        print(f"   Found {len(results)} activities")
-        return results
-    
-    def get_meals(city: str = None, limit: int = 15):
-        filters = {"status": "Active"}
-        if city:
-            filters["city"] = city
-            
-        print(f"🍽️ Searching meals: {filters}")
-        results = frappe.get_list("Meal", fields=[
-            "name", "meal_name", "meal_type", "city", "adult_price", "currency"
-        ], filters=filters, limit=limit)
-        print(f"   Found {len(results)} meals")
-        return results
-    
-    def get_transportation(arrival_city: str = None, limit: int = 10):
-        filters = {"status": "Confirmed"}
-        if arrival_city:
-            filters["arrival_city"] = arrival_city
-            
-        print(f"✈️ Searching transportation: {filters}")
-        results = frappe.get_list("Transportation", fields=[
-            "name", "transportation_name", "service_class", "arrival_city", "adult_price", "currency"
-        ], filters=filters, limit=limit)
-        print(f"   Found {len(results)} transportation options")
-        return results
-    
-    def get_transfers(city: str = None, limit: int = 10):
-        filters = {"status": "Confirmed"}
-        if city:
-            filters["pickup_city"] = city
-            
-        print(f"🚗 Searching transfers: {filters}")
-        results = frappe.get_list("Transfer", fields=[
-            "name", "transfer_name", "transfer_type", "pickup_city", "base_price", "currency"
-        ], filters=filters, limit=limit)
-        print(f"   Found {len(results)} transfers")
-        return results
-    
-    # Collect available services for all destinations
-    all_services = {"hotels": [], "activities": [], "meals": [], "transportation": [], "transfers": []}
-    
-    print(f"\n📦 Collecting services for each destination:")
-    for destination in destinations:
-        print(f"\n   Processing destination: {destination}")
-        
-        hotels = get_hotels(city=destination)
-        activities = get_activities(city=destination)
-        meals = get_meals(city=destination)
-        transportation = get_transportation(arrival_city=destination)
-        transfers = get_transfers(city=destination)
-        
-        all_services["hotels"].extend(hotels)
-        all_services["activities"].extend(activities)
-        all_services["meals"].extend(meals)
-        all_services["transportation"].extend(transportation)
-        all_services["transfers"].extend(transfers)
-        
-        print(f"     Added: {len(hotels)} hotels, {len(activities)} activities, {len(meals)} meals, {len(transportation)} transport, {len(transfers)} transfers")
+    # Destinations without any catalog entries are skipped up front
+    service_cities = _get_service_cities() if destinations else set()
+    catalog_destinations = [destination for destination in destinations if destination in service_cities]
+    
+    all_services = {service_type: [] for service_type in SERVICE_SOURCES}
+    if catalog_destinations:
+        # Collect available services for all destinations. The lookups are small and mostly
+        # cache hits, so they run serially on the request's own connection
+        for service_type in SERVICE_SOURCES:
+            by_city = _get_services_by_city(service_type, catalog_destinations)
+            all_services[service_type] = [
+                service for destination in catalog_destinations for service in by_city[destination]
+            ]
     
-    print(f"\n📊 Total services collected:")
-    for service_type, service_list in all_services.items():
-        print(f"   - {service_type.title()}: {len(service_list)} total")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Services collected for {destinations}: "
+            + ", ".join(f"{len(v)} {k}" for k, v in all_services.items())
+        )
     
     # AI-only approach - no rule-based fallback
-    print(f"🤖 Using AI-powered service selection...")
     return _build_ai_itinerary(trip, selected_package, destinations, all_services)
 
 def _build_ai_itinerary(trip: Any, package: Dict, destinations: List[str], services: Dict) -> Dict:
@@ -1007,13 +1113,12 @@ def _build_ai_itinerary(trip: Any, package: Dict, destinations: List[str], servi
 You are a travel planning expert. Create a detailed day-by-day itinerary using the available services.
 
 TRIP REQUIREMENTS:
-{json.dumps(trip_requirements, indent=2)}
+{_dumps(trip_requirements, indent=True)}
 
 SELECTED PACKAGE BASELINE:
-{json.dumps(package, indent=2)}
+{_dumps(package, indent=True)}
 
-AVAILABLE SERVICES:
-{json.dumps(services, indent=2)}
+The available services are provided in the context under "available_services".
 
 Select the best services and create a {trip_requirements['no_of_days']}-day itinerary. Consider:
 1. Customer preferences (hotel stars, meal types, activities, transport class)
@@ -1059,21 +1164,20 @@ Respond with JSON:
         # Use the correct AI function from frappe_ai
         from frappe_ai.utils.llm_utils import analyze_with_llm
         
-        print(f"🤖 Calling AI with analyze_with_llm...")
-        
         # Prepare context with all available services - handle missing fields gracefully
         context_data = {
             "trip_requirements": trip_requirements,
             "available_services": {
-                "hotels": [{"name": h["name"], "hotel_name": h.get("hotel_name", "Unknown"), "star_rating": h.get("star_rating", "3"), "city": h.get("city", ""), "base_price": h.get("base_price", 100)} for h in services["hotels"]],
-                "activities": [{"name": a["name"], "activity_name": a.get("activity_name", "Unknown"), "city": a.get("city", ""), "adult_price": a.get("adult_price", 50), "duration_hours": a.get("duration_hours", 2)} for a in services["activities"]],
-                "meals": [{"name": m["name"], "meal_name": m.get("meal_name", "Unknown"), "meal_type": m.get("meal_type", "Lunch"), "city": m.get("city", ""), "adult_price": m.get("adult_price", 30)} for m in services["meals"]],
-                "transportation": [{"name": t["name"], "transportation_name": t.get("transportation_name", "Unknown"), "arrival_city": t.get("arrival_city", ""), "adult_price": t.get("adult_price", 100)} for t in services["transportation"]],
-                "transfers": [{"name": tf["name"], "transfer_name": tf.get("transfer_name", "Unknown"), "pickup_city": tf.get("pickup_city", ""), "base_price": tf.get("base_price", 50)} for tf in services["transfers"]]
+                service_type: [
+                    {field: service[field] for field in fields if service.get(field) is not None}
+                    for service in services[service_type]
+                ]
+                for service_type, fields in SERVICE_CONTEXT_FIELDS.items()
             }
         }
         
-        context = json.dumps(context_data, indent=2)
+        # Compact JSON: indentation only adds prompt tokens
+        context = _dumps(context_data)
         
         ai_result = analyze_with_llm(
             context=context,
@@ -1083,27 +1187,14 @@ Respond with JSON:
             json_response=True
         )
         
-        print(f"   AI Success: {ai_result.get('success')}")
-        if ai_result.get("content"):
-            print(f"   AI Content Length: {len(ai_result['content'])} chars")
-        
         if ai_result.get("success") and ai_result.get("content"):
             ai_response = json.loads(ai_result["content"])
             daily_itinerary = ai_response.get("daily_itinerary", [])
             
-            print(f"   AI returned {len(daily_itinerary)} days")
-            
-            # Check if AI populated services in daily itinerary
-            has_populated_services = any(
-                day.get("services") and len(day["services"]) > 0 
-                for day in daily_itinerary
-            )
-            
-            print(f"   AI populated services: {has_populated_services}")
-            
-            # If AI didn't populate services properly, create from selected services
-            if not has_populated_services and ai_response.get("selected_services"):
-                print("🔧 AI didn't populate daily services - creating from selected services...")
+            # If AI didn't populate services in any day, create them from selected services.
+            # any() stops at the first populated day, so the fallback costs nothing otherwise.
+            if ai_response.get("selected_services") and not any(day.get("services") for day in daily_itinerary):
+                logger.debug("AI didn't populate daily services - creating from selected services")
                 daily_itinerary = _create_daily_itinerary_from_services(
                     ai_response.get("selected_services", {}), 
                     destinations, 
@@ -1111,7 +1202,6 @@ Respond with JSON:
                     services
                 )
             
-            print(f"✅ AI itinerary generation completed successfully")
             return {
                 "itinerary": daily_itinerary,
                 "services": ai_response.get("selected_services", {}),
@@ -1121,22 +1211,25 @@ Respond with JSON:
             }
         else:
             error_msg = f"AI failed to generate response: {ai_result.get('error', 'Unknown error')}"
-            print(f"❌ {error_msg}")
             raise Exception(error_msg)
             
     except Exception as e:
         error_msg = f"AI itinerary generation failed: {str(e)}"
-        print(f"❌ {error_msg}")
         frappe.log_error(error_msg, "AI Itinerary")
         raise Exception(error_msg)
 
 def _create_daily_itinerary_from_services(selected_services: Dict, destinations: List[str], num_days: int, all_services: Dict) -> List[Dict]:
     """Helper function to create daily itinerary structure from selected services"""
     
+    # Index the available services by name once instead of scanning per selection
+    hotels_by_name = {h["name"]: h for h in all_services["hotels"]}
+    activities_by_name = {a["name"]: a for a in all_services["activities"]}
+    meals_by_name = {m["name"]: m for m in all_services["meals"]}
+    
     # Get service details for each selected service - handle missing fields
     hotel_services = []
     for hotel_name in selected_services.get("hotels", []):
-        hotel_data = next((h for h in all_services["hotels"] if h["name"] == hotel_name), None)
+        hotel_data = hotels_by_name.get(hotel_name)
         if hotel_data:
             hotel_services.append({
                 "type": "hotel", 
@@ -1149,7 +1242,7 @@ def _create_daily_itinerary_from_services(selected_services: Dict, destinations:
     
     activity_services = []
     for activity_name in selected_services.get("activities", []):
-        activity_data = next((a for a in all_services["activities"] if a["name"] == activity_name), None)
+        activity_data = activities_by_name.get(activity_name)
         if activity_data:
             activity_services.append({
                 "type": "activity",
@@ -1163,7 +1256,7 @@ def _create_daily_itinerary_from_services(selected_services: Dict, destinations:
     
     meal_services = []
     for meal_name in selected_services.get("meals", []):
-        meal_data = next((m for m in all_services["meals"] if m["name"] == meal_name), None)
+        meal_data = meals_by_name.get(meal_name)
         if meal_data:
             meal_services.append({
                 "type": "meal",
@@ -1174,6 +1267,17 @@ def _create_daily_itinerary_from_services(selected_services: Dict, destinations:
                 "city": meal_data.get("city", "")
             })
     
+    # Group the selected services by city for the per-day lookups
+    hotels_by_city = {}
+    for hotel in hotel_services:
+        hotels_by_city.setdefault(hotel["city"], hotel)
+    activities_by_city = defaultdict(list)
+    for activity in activity_services:
+        activities_by_city[activity["city"]].append(activity)
+    meals_by_city = defaultdict(list)
+    for meal in meal_services:
+        meals_by_city[meal["city"]].append(meal)
+    
     # Create daily itinerary
     daily_itinerary = []
     for day in range(1, num_days + 1):
@@ -1181,12 +1285,12 @@ def _create_daily_itinerary_from_services(selected_services: Dict, destinations:
         day_services = []
         
         # Add hotel for each day
-        day_hotel = next((h for h in hotel_services if h["city"] == day_city), None)
+        day_hotel = hotels_by_city.get(day_city)
         if day_hotel:
             day_services.append(day_hotel)
         
         # Distribute activities across days
-        day_activities = [a for a in activity_services if a["city"] == day_city]
+        day_activities = activities_by_city.get(day_city)
         if day_activities:
             activities_per_day = max(1, len(day_activities) // num_days)
             start_idx = (day-1) * activities_per_day
@@ -1194,18 +1298,18 @@ def _create_daily_itinerary_from_services(selected_services: Dict, destinations:
             day_services.extend(day_activities[start_idx:end_idx])
         
         # Distribute meals across days
-        day_meals = [m for m in meal_services if m["city"] == day_city]
+        day_meals = meals_by_city.get(day_city)
         if day_meals:
             meals_per_day = max(1, len(day_meals) // num_days)
             start_idx = (day-1) * meals_per_day
             end_idx = min(start_idx + meals_per_day, len(day_meals))
             day_services.extend(day_meals[start_idx:end_idx])
         
+        day_services.sort(key=by_time)
         daily_itinerary.append({
             "day": day,
             "city": day_city,
-            "services": sorted(day_services, key=lambda x: x["time"])
+            "services": day_services
         })
     
     return daily_itinerary
-
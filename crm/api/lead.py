@@ -1,10 +1,19 @@
 import frappe
 from frappe import _
+from frappe.model import default_fields
+from frappe.utils import cint
+
+from crm.api.lead_with_requirements import clear_list_cache, get_linked_leads
+from crm.utils import bulk_delete_docs, stream_csv_export
 
 
 @frappe.whitelist()
-def export_data(doctype=None, export_fields=None, filters=None, file_type="CSV"):
-	"""Export leads data using Frappe's built-in export functionality"""
+def export_data(doctype=None, export_fields=None, filters=None, file_type="CSV", stream=False):
+	"""
+	Export leads data using Frappe's built-in export functionality.
+	With `stream`, a CSV of the doctype's own fields is streamed page by page instead; its header
+	row holds fieldnames rather than labels.
+	"""
 	from frappe.core.doctype.data_import.exporter import Exporter
 	
 	# Default to CRM Lead doctype
@@ -25,6 +34,13 @@ def export_data(doctype=None, export_fields=None, filters=None, file_type="CSV")
 			]
 		}
 	
+	export_fields = frappe.parse_json(export_fields)
+	if cint(stream) and file_type == "CSV" and list(export_fields) == [doctype]:
+		# The streamed export selects columns directly, so drop fields the doctype does not have
+		meta = frappe.get_meta(doctype)
+		fields = [field for field in export_fields[doctype] if field in default_fields or meta.has_field(field)]
+		return stream_csv_export(doctype, fields, filters)
+	
 	# Create exporter instance
 	exporter = Exporter(
 		doctype=doctype,
@@ -41,9 +57,9 @@ def export_data(doctype=None, export_fields=None, filters=None, file_type="CSV")
 
 # Alias for backward compatibility
 @frappe.whitelist()
-def export(doctype=None, export_fields=None, filters=None, file_type="CSV"):
+def export(doctype=None, export_fields=None, filters=None, file_type="CSV", stream=False):
 	"""Alias for export_data function"""
-	return export_data(doctype, export_fields, filters, file_type)
+	return export_data(doctype, export_fields, filters, file_type, stream)
 
 
 @frappe.whitelist()
@@ -95,9 +111,24 @@ def bulk_actions(action, names, **kwargs):
 		names = frappe.parse_json(names) if isinstance(names, str) else [names]
 	
 	if action == "delete":
-		for name in names:
-			if frappe.has_permission("CRM Lead", "delete", name):
-				frappe.delete_doc("CRM Lead", name)
+		permitted = [name for name in names if frappe.has_permission("CRM Lead", "delete", name)]
+		if not permitted:
+			return {"message": _("Selected leads deleted successfully")}
+		
+		if cint(kwargs.get("force_hooks")):
+			# Full delete_doc so controllers and on_trash hooks run
+			per_doc = permitted
+		else:
+			# Leads converted to deals or referenced by tasks, notes, call logs or notifications
+			# still go through delete_doc so link checks apply
+			linked = get_linked_leads(permitted)
+			per_doc = [name for name in permitted if name in linked]
+			bulk_delete_docs("CRM Lead", [name for name in permitted if name not in linked])
+			# The raw DELETE skips on_trash, which is where the cached lead lists are invalidated
+			clear_list_cache()
+		
+		for name in per_doc:
+			frappe.delete_doc("CRM Lead", name)
 		return {"message": _("Selected leads deleted successfully")}
 	
 	elif action == "update_status":
@@ -105,13 +136,22 @@ def bulk_actions(action, names, **kwargs):
 		if not status:
 			frappe.throw(_("Status is required"))
 		
-		for name in names:
-			if frappe.has_permission("CRM Lead", "write", name):
+		permitted = [name for name in names if frappe.has_permission("CRM Lead", "write", name)]
+		if not permitted:
+			return {"message": _("Status updated for selected leads")}
+		
+		if cint(kwargs.get("force_hooks")):
+			# Full save so validations, status change logs and on_update hooks run
+			for name in permitted:
 				lead = frappe.get_doc("CRM Lead", name)
 				lead.status = status
 				lead.save()
+		else:
+			frappe.db.set_value("CRM Lead", {"name": ["in", permitted]}, "status", status)
+			# The bulk UPDATE skips on_update, which is where the cached lead lists are invalidated
+			clear_list_cache()
 		
 		return {"message": _("Status updated for selected leads")}
 	
 	else:
-		frappe.throw(_("Invalid action: {0}").format(action))
\ No newline at end of file
+		frappe.throw(_("Invalid action: {0}").format(action))
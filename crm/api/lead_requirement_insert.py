@@ -1,6 +1,58 @@
 import frappe
 from frappe import _
-import json
+from frappe.model.document import bulk_insert
+from frappe.utils import cint
+import logging
+
+import orjson
+
+from crm.utils import bulk_insert_child_rows, skip_mandatory_for_tables
+
+logger = frappe.logger("lead_requirement", allow_site=True)
+
+# Payload shapes for the destination and activity fields, dispatched on the value's type;
+# a single value is treated as a one-item list and other types are ignored
+AS_LIST = {
+    str: lambda value: (value,),
+    list: lambda value: value,
+}
+DESTINATION_ITEM_PARSERS = {
+    str: lambda dest: (dest, 1),
+    dict: lambda dest: (dest.get("city") or dest.get("destination"), dest.get("nights", 1)),
+}
+ACTIVITY_ITEM_PARSERS = {
+    str: lambda activity: activity,
+    dict: lambda activity: activity.get("activity") or activity.get("name"),
+}
+
+# Lead-specific fields in the insert payload
+LEAD_FIELDS = frozenset({
+    "doctype", "link_to_contact", "status", "source", "lead_owner", 
+    "priority", "service_type", "notes", "tags", "_user_tags", "naming_series"
+})
+
+# Requirement-specific fields in the insert payload
+REQUIREMENT_FIELD_MAPPING = {
+    "trip_name": "title",
+    "departure_city": "departure",
+    "destination_city": "destination_city",
+    "travel_dates": "travel_dates",
+    "date_flexibility": "flexible_days",
+    "travelers": "passengers", 
+    "budget_per_person": "budget",
+    "hotel_category": "category",
+    "number_of_rooms": "no_of_rooms",
+    "special_interests": "activity",
+    "notes": "notes"
+}
+
+# Payload keys that go to the Requirement; shared keys (notes) stay with the lead
+REQUIREMENT_FIELDS = frozenset(REQUIREMENT_FIELD_MAPPING) - LEAD_FIELDS
+
+# Selecting all of these services is stored as just "Tour Package"
+TOUR_PACKAGE_SERVICES = frozenset({
+    "Tour Package", "Hotels", "Transportation", "Activities", "Transfers", "Visa"
+})
 
 @frappe.whitelist()
 def insert_lead_with_requirement(doc):
@@ -33,58 +85,22 @@ def insert_lead_with_requirement(doc):
     try:
         # Parse if string
         if isinstance(doc, str):
-            doc = json.loads(doc)
-        
-        print(f"=== Lead+Requirement Creation Debug ===")
-        print(f"Received doc type: {type(doc)}")
-        print(f"Doc keys: {list(doc.keys()) if isinstance(doc, dict) else 'Not a dict'}")
+            doc = orjson.loads(doc)
         
         if not doc or doc.get("doctype") != "CRM Lead":
             frappe.throw(_("Invalid document type. Expected CRM Lead."))
         
-        # Extract lead-specific fields
-        lead_fields = [
-            "doctype", "link_to_contact", "status", "source", "lead_owner", 
-            "priority", "service_type", "notes", "tags", "_user_tags", "naming_series"
-        ]
-        
-        # Extract requirement-specific fields  
-        requirement_field_mapping = {
-            "trip_name": "title",
-            "departure_city": "departure",
-            "destination_city": "destination_city",
-            "travel_dates": "travel_dates",
-            "date_flexibility": "flexible_days",
-            "travelers": "passengers", 
-            "budget_per_person": "budget",
-            "hotel_category": "category",
-            "number_of_rooms": "no_of_rooms",
-            "special_interests": "activity",
-            "notes": "notes"
-        }
+        # Separate the data; service_type is kept apart for processing below
+        lead_data = {key: doc[key] for key in LEAD_FIELDS.intersection(doc) if doc[key] is not None}
+        service_type_array = lead_data.pop("service_type", None)
+        requirement_data = {key: doc[key] for key in REQUIREMENT_FIELDS.intersection(doc) if doc[key] is not None}
         
-        # Separate the data
-        lead_data = {}
-        requirement_data = {}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Lead fields: %s, requirement fields: %s, service types: %s",
+                list(lead_data), list(requirement_data), service_type_array
+            )
         
-        # Store service_type array separately for processing
-        service_type_array = None
-        
-        for key, value in doc.items():
-            if key in lead_fields and value is not None:
-                # Skip service_type - we'll handle it separately
-                if key == "service_type":
-                    service_type_array = value
-                    continue
-                else:
-                    lead_data[key] = value
-            elif key in requirement_field_mapping and value is not None:
-                requirement_data[key] = value
-        
-        print(f"\nLead fields extracted: {list(lead_data.keys())}")
-        print(f"Requirement fields found: {list(requirement_data.keys())}")
-        print(f"Service type array: {service_type_array}")
-                
         # Handle tags specially
         tags = lead_data.pop("tags", None) or lead_data.pop("_user_tags", None)
         
@@ -94,52 +110,25 @@ def insert_lead_with_requirement(doc):
         if not hasattr(lead_doc, "naming_series") or not lead_doc.naming_series:
             lead_doc.naming_series = "CRM-LEAD-.YYYY.-"
         
-        print(f"\nCreating lead...")
-        lead_doc.insert(ignore_permissions=True)
-        print(f"Lead created successfully: {lead_doc.name}")
-        
-        # Handle tags after creation
+        # Handle tags and service types before the insert so the lead is written once
         if tags:
             if isinstance(tags, list):
                 lead_doc._user_tags = ",".join(tags)
             else:
                 lead_doc._user_tags = tags
-            lead_doc.save(ignore_permissions=True)
         
-        # Handle service types
+        # Handle service types; if all tour package services are selected, just add "Tour Package"
         if service_type_array and isinstance(service_type_array, list):
-            print(f"\nProcessing service types: {service_type_array}")
-            
-            # Special logic for Tour Package
-            tour_package_services = ['Tour Package', 'Hotels', 'Transportation', 
-                                   'Activities', 'Transfers', 'Visa']
-            
-            # Check if all tour package services are selected
-            if all(service in service_type_array for service in tour_package_services):
-                # If all services are selected, just add "Tour Package"
-                lead_doc.append("service_types", {
-                    "service_type": "Tour Package"
-                })
-                print(f"All services selected, adding only 'Tour Package'")
-            else:
-                # Add each selected service
-                for service in service_type_array:
-                    lead_doc.append("service_types", {
-                        "service_type": service
-                    })
-                    print(f"Added service type: {service}")
-            
-            lead_doc.save(ignore_permissions=True)
-            print(f"Lead updated with service types")
+            services = ["Tour Package"] if TOUR_PACKAGE_SERVICES.issubset(service_type_array) else service_type_array
+            lead_doc.set("service_types", [{"service_type": service} for service in services])
+        
+        lead_doc.insert(ignore_permissions=True)
         
         # Create Requirement if we have trip data
         requirement_doc = None
         if requirement_data:
-            print(f"\nCreating requirement with data: {requirement_data}")
             requirement_doc = create_requirement_from_data(lead_doc.name, requirement_data)
-            print(f"Requirement created: {requirement_doc.name}")
-        else:
-            print("\nNo requirement data found, skipping requirement creation")
+            logger.debug("Requirement %s created for lead %s", requirement_doc.name, lead_doc.name)
             
         # Return the lead doc in the expected format
         result = lead_doc.as_dict()
@@ -159,11 +148,6 @@ def create_requirement_from_data(lead_id, data):
     """
     Helper to create Requirement from frontend data
     """
-    print(f"\n=== Creating Requirement ===")
-    print(f"Lead ID: {lead_id}")
-    print(f"Data keys: {list(data.keys())}")
-    print(f"Full data: {data}")
-    
     req_doc = frappe.new_doc("Requirement")
     req_doc.lead = lead_id
     
@@ -174,20 +158,16 @@ def create_requirement_from_data(lead_id, data):
     
     # Handle travel dates
     travel_dates = data.get("travel_dates")
-    print(f"🗓️ Processing travel_dates: {travel_dates}")
     if isinstance(travel_dates, dict):
         # Handle both formats: {start_date, end_date} and {start, end}
         req_doc.start_date = travel_dates.get("start_date") or travel_dates.get("start")
         req_doc.end_date = travel_dates.get("end_date") or travel_dates.get("end")
-        print(f"🗓️ Set dates - start: {req_doc.start_date}, end: {req_doc.end_date}")
     
     # Handle date flexibility
     date_flexibility = data.get("date_flexibility")
-    print(f"🔄 Processing date_flexibility: {date_flexibility}")
     if date_flexibility:
         # Store the flexibility value directly as string
         req_doc.flexible_days = date_flexibility
-        print(f"🔄 Set flexible_days to: {req_doc.flexible_days}")
     
     # Handle budget (per person budget only)
     budget_per_person = data.get("budget_per_person")
@@ -205,125 +185,116 @@ def create_requirement_from_data(lead_id, data):
     # Handle number of rooms
     req_doc.no_of_rooms = data.get("number_of_rooms", 1)
     
-    # Handle destinations (child table)
-    destination = data.get("destination_city")
-    if destination:
-        if isinstance(destination, str):
-            # Single destination
-            add_destination_to_requirement(req_doc, destination, 1)
-        elif isinstance(destination, list):
-            # Multiple destinations
-            for dest in destination:
-                if isinstance(dest, str):
-                    add_destination_to_requirement(req_doc, dest, 1)
-                elif isinstance(dest, dict):
-                    add_destination_to_requirement(
-                        req_doc,
-                        dest.get("city") or dest.get("destination"),
-                        dest.get("nights", 1)
-                    )
-    
-    # Handle passengers (child table)
-    travelers = data.get("travelers")
-    if travelers:
-        pax_total = 0
-        
-        if isinstance(travelers, dict):
-            # Format: {"adults": 2, "children": 1, "infants": 0, "childAges": [13, 6], "infantMonths": [9, 2]}
-            
-            # Add adults
-            adult_count = travelers.get("adults", 0)
-            for i in range(int(adult_count) if adult_count else 0):
-                req_doc.append("passenger_details", {
-                    "passenger_type": "Adult",
-                    "age": None  # Adults don't need age specified
-                })
-                pax_total += 1
-            
-            # Add children with their ages
-            child_count = travelers.get("children", 0)
-            child_ages = travelers.get("childAges", [])
-            for i in range(int(child_count) if child_count else 0):
-                age = child_ages[i] if i < len(child_ages) else None
-                req_doc.append("passenger_details", {
-                    "passenger_type": "Child",
-                    "age": age
-                })
-                pax_total += 1
-            
-            # Add infants with their ages in months (convert to age in years)
-            infant_count = travelers.get("infants", 0)
-            infant_months = travelers.get("infantMonths", [])
-            for i in range(int(infant_count) if infant_count else 0):
-                months = infant_months[i] if i < len(infant_months) else None
-                # Convert months to age (0 for infants less than 1 year)
-                age = 0 if months is not None else None
-                req_doc.append("passenger_details", {
-                    "passenger_type": "Infant", 
-                    "age": age
-                })
-                pax_total += 1
-        
-        req_doc.pax = pax_total
+    # Collect the child rows up front; they are written once the Requirement exists
+    destination_rows = _destination_rows(data.get("destination_city"))
+    passenger_rows = _passenger_rows(data.get("travelers"))
+    activity_rows = _activity_rows(data.get("special_interests"))
     
-    # Handle activities (child table)
-    activities = data.get("special_interests")
-    if activities:
-        if isinstance(activities, str):
-            add_activity_to_requirement(req_doc, activities)
-        elif isinstance(activities, list):
-            for activity in activities:
-                if isinstance(activity, str):
-                    add_activity_to_requirement(req_doc, activity)
-                elif isinstance(activity, dict):
-                    add_activity_to_requirement(
-                        req_doc, 
-                        activity.get("activity") or activity.get("name")
-                    )
+    if data.get("travelers"):
+        req_doc.pax = len(passenger_rows)
     
+    # Create any missing Destination / Activity List masters, dropping rows whose master could not be created
+    failures = []
+    destinations = _ensure_masters("Destination", "city", {row["destination"] for row in destination_rows}, failures, country="India")
+    destination_rows = [row for row in destination_rows if row["destination"] in destinations]
+    activities = _ensure_masters("Activity List", "activity", {row["activity"] for row in activity_rows}, failures)
+    activity_rows = [row for row in activity_rows if row["activity"] in activities]
+    if failures:
+        frappe.log_error("\n".join(failures), f"Requirement masters not created for lead {lead_id}")
     
+    # Child rows are bulk inserted below, so only the tables that get rows skip the mandatory check
+    skip_mandatory_for_tables(req_doc, [
+        fieldname
+        for fieldname, rows in (("destination_city", destination_rows), ("passenger_details", passenger_rows), ("activity", activity_rows))
+        if rows
+    ])
     req_doc.insert(ignore_permissions=True)
+    
+    bulk_insert_child_rows(req_doc, "destination_city", destination_rows)
+    bulk_insert_child_rows(req_doc, "passenger_details", passenger_rows)
+    bulk_insert_child_rows(req_doc, "activity", activity_rows)
     return req_doc
 
 
-def add_destination_to_requirement(req_doc, city_name, nights=1):
-    """Add destination to requirement, creating if needed"""
-    if not city_name:
-        return
-        
-    try:
-        # Create destination if it doesn't exist
-        if not frappe.db.exists("Destination", city_name):
-            dest_doc = frappe.new_doc("Destination")
-            dest_doc.city = city_name
-            dest_doc.country = "India"  # Default
-            dest_doc.insert(ignore_permissions=True)
-        
-        req_doc.append("destination_city", {
-            "destination": city_name,
-            "nights": nights or 1
-        })
-    except Exception as e:
-        frappe.log_error(f"Failed to add destination '{city_name}': {e}")
+def _destination_rows(destination):
+    """Destination child rows from a city name or a list of names / {city, nights} dicts"""
+    rows = []
+    for dest in AS_LIST.get(type(destination), _empty)(destination):
+        parse = DESTINATION_ITEM_PARSERS.get(type(dest))
+        if not parse:
+            continue
+        city_name, nights = parse(dest)
+        if city_name:
+            rows.append({"destination": city_name, "nights": nights or 1})
+    return rows
 
 
-def add_activity_to_requirement(req_doc, activity_name):
-    """Add activity to requirement, creating if needed"""
-    if not activity_name:
-        return
-        
+def _passenger_rows(travelers):
+    """
+    Passenger child rows from the travelers dict:
+    {"adults": 2, "children": 1, "infants": 0, "childAges": [13, 6], "infantMonths": [9, 2]}
+    """
+    if not isinstance(travelers, dict):
+        return []
+    
+    child_ages = travelers.get("childAges", [])
+    infant_months = travelers.get("infantMonths", [])
+    # Adults don't need an age; infants are recorded as age 0 when their months are known
+    return [
+        *({"passenger_type": "Adult", "age": None} for i in range(cint(travelers.get("adults")))),
+        *(
+            {"passenger_type": "Child", "age": child_ages[i] if i < len(child_ages) else None}
+            for i in range(cint(travelers.get("children")))
+        ),
+        *(
+            {"passenger_type": "Infant", "age": 0 if i < len(infant_months) and infant_months[i] is not None else None}
+            for i in range(cint(travelers.get("infants")))
+        ),
+    ]
+
+
+def _activity_rows(activities):
+    """Activity child rows from an activity name or a list of names / {activity} dicts"""
+    rows = []
+    for activity in AS_LIST.get(type(activities), _empty)(activities):
+        parse = ACTIVITY_ITEM_PARSERS.get(type(activity))
+        activity = parse(activity) if parse else None
+        if activity and isinstance(activity, str):
+            rows.append({"activity": activity})
+    return rows
+
+
+def _empty(value):
+    return ()
+
+
+def _ensure_masters(doctype, fieldname, names, failures, **defaults):
+    """
+    Creates the missing masters (named by `fieldname`) with one existence query and one
+    bulk insert. Returns the names that can be linked to; a failed insert is added to
+    `failures` for the caller to log.
+    """
+    if not names:
+        return set()
+    
+    existing = set(frappe.get_all(doctype, filters={"name": ["in", list(names)]}, pluck="name"))
+    missing = names - existing
+    if not missing:
+        return names
+    
     try:
-        # Create activity if it doesn't exist
-        if not frappe.db.exists("Activity List", activity_name):
-            activity_doc = frappe.new_doc("Activity List")
-            activity_doc.activity = activity_name
-            activity_doc.insert(ignore_permissions=True)
-        
-        req_doc.append("activity", {
-            "activity": activity_name
-        })
+        bulk_insert(doctype, (_new_master(doctype, fieldname, name, defaults) for name in missing), ignore_duplicates=True)
     except Exception as e:
-        frappe.log_error(f"Failed to add activity '{activity_name}': {e}")
+        failures.append(f"Failed to create {doctype} records {sorted(missing)}: {e}")
+        return existing
+    return names
+
+
+def _new_master(doctype, fieldname, name, defaults):
+    doc = frappe.new_doc(doctype)
+    doc.update({fieldname: name, **defaults})
+    doc.name = name
+    return doc
 
 
 def map_passenger_type(frontend_type):
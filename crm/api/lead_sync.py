@@ -9,8 +9,12 @@ def sync_lead_to_contact(doc, method):
 		# For direct database updates, we need to check differently
 		sync_fields = ["email", "mobile_no", "first_name", "last_name", "gender", "instagram"]
 		
-		# Since we can't use has_value_changed() in global handlers,
-		# we'll always attempt sync and let the sync function handle it
+		# Compare against the snapshot taken before save; when none of the watched fields
+		# changed there is nothing to sync and the contact is not loaded at all
+		old = doc.get_doc_before_save()
+		if old and all(old.get(field) == doc.get(field) for field in sync_fields):
+			return
+		
 		frappe.logger().info(f"🔄 Attempting to sync lead {doc.name} to contact")
 		
 		try:
@@ -35,6 +39,18 @@ def sync_lead_contact_direct(lead_doc):
 		return
 	
 	try:
+		# Only adding an email or phone row needs the full document; scalar fields are
+		# written directly otherwise
+		needs_email = lead_doc.email and not frappe.db.exists(
+			"Contact Email", {"parenttype": "Contact", "parent": contact, "email_id": lead_doc.email}
+		)
+		needs_mobile = lead_doc.mobile_no and not frappe.db.exists(
+			"Contact Phone", {"parenttype": "Contact", "parent": contact, "phone": lead_doc.mobile_no}
+		)
+		if not (needs_email or needs_mobile):
+			update_contact_fields_direct(contact, lead_doc)
+			return
+		
 		frappe.logger().info(f"📋 Loading contact document: {contact}")
 		contact_doc = frappe.get_doc("Contact", contact)
 		
@@ -65,30 +81,52 @@ def sync_lead_contact_direct(lead_doc):
 		frappe.logger().error(f"❌ Error in direct sync: {str(e)}")
 		raise
 
+def update_contact_fields_direct(contact, lead_doc):
+	"""
+	Update the contact's scalar fields from the lead with a single UPDATE. Contact validate
+	and on_update hooks and Version tracking do not run on this path.
+	"""
+	from frappe.contacts.doctype.contact.contact import get_full_name
+	
+	values = {
+		"first_name": lead_doc.first_name or lead_doc.lead_name,
+		"last_name": lead_doc.last_name,
+		"gender": lead_doc.gender,
+	}
+	if getattr(lead_doc, 'instagram', None) and frappe.get_meta("Contact").has_field("instagram"):
+		values["instagram"] = lead_doc.instagram
+	
+	current = frappe.db.get_value("Contact", contact, [*values, "middle_name", "company_name"], as_dict=True)
+	if all(current.get(field) == value for field, value in values.items()):
+		return
+	
+	# full_name is normally derived on save, so it is kept in step here
+	values["full_name"] = get_full_name(values["first_name"], current.middle_name, values["last_name"], current.company_name)
+	frappe.logger().info(f"💾 Updating contact {contact} fields: {list(values)}")
+	frappe.db.set_value("Contact", contact, values, update_modified=True)
+
 def get_associated_contact_direct(lead_doc):
 	"""Find contact associated with lead - direct version"""
 	frappe.logger().info(f"🔎 Looking for contact for lead {lead_doc.name}")
 	
-	# Find by email
+	# Match by email, then mobile, then Instagram in a single query; the first
+	# column keeps that precedence when more than one lookup matches
+	lookups = []
 	if lead_doc.email:
-		email_contact = frappe.db.get_value("Contact Email", {"email_id": lead_doc.email}, "parent")
-		frappe.logger().info(f"📧 Email search result: {email_contact}")
-		if email_contact:
-			return email_contact
-	
-	# Find by mobile
+		lookups.append("SELECT 1 AS priority, parent AS contact FROM `tabContact Email` WHERE email_id = %(email)s")
 	if lead_doc.mobile_no:
-		mobile_contact = frappe.db.get_value("Contact Phone", {"phone": lead_doc.mobile_no}, "parent")
-		frappe.logger().info(f"📱 Mobile search result: {mobile_contact}")
-		if mobile_contact:
-			return mobile_contact
+		lookups.append("SELECT 2 AS priority, parent AS contact FROM `tabContact Phone` WHERE phone = %(mobile_no)s")
+	if getattr(lead_doc, 'instagram', None):
+		lookups.append("SELECT 3 AS priority, name AS contact FROM `tabContact` WHERE instagram = %(instagram)s")
 	
-	# Find by Instagram
-	if hasattr(lead_doc, 'instagram') and lead_doc.instagram:
-		instagram_contact = frappe.db.get_value("Contact", {"instagram": lead_doc.instagram}, "name")
-		frappe.logger().info(f"📷 Instagram search result: {instagram_contact}")
-		if instagram_contact:
-			return instagram_contact
+	if lookups:
+		match = frappe.db.sql(
+			" UNION ALL ".join(f"({query} LIMIT 1)" for query in lookups) + " ORDER BY priority LIMIT 1",
+			{"email": lead_doc.email, "mobile_no": lead_doc.mobile_no, "instagram": getattr(lead_doc, 'instagram', None)}
+		)
+		frappe.logger().info(f"🔎 Contact search result: {match}")
+		if match:
+			return match[0][1]
 	
 	frappe.logger().info("❌ No contact found via direct search")
 	return None
@@ -97,36 +135,34 @@ def update_contact_email_direct(contact_doc, new_email):
 	"""Update contact email - direct version"""
 	frappe.logger().info(f"📧 Updating contact email to: {new_email}")
 	
-	# Check if email already exists
-	existing_email = None
+	# Check if email already exists, noting any primary email in the same pass
+	has_primary = False
 	for email_row in contact_doc.email_ids:
 		if email_row.email_id == new_email:
-			existing_email = email_row
-			break
+			return
+		has_primary = has_primary or email_row.get("is_primary")
 	
-	if not existing_email:
-		# Add new email
-		frappe.logger().info(f"➕ Adding new email: {new_email}")
-		contact_doc.append("email_ids", {
-			"email_id": new_email,
-			"is_primary": 1 if not any(e.get("is_primary") for e in contact_doc.email_ids) else 0
-		})
+	# Add new email
+	frappe.logger().info(f"➕ Adding new email: {new_email}")
+	contact_doc.append("email_ids", {
+		"email_id": new_email,
+		"is_primary": 0 if has_primary else 1
+	})
 
 def update_contact_mobile_direct(contact_doc, new_mobile):
 	"""Update contact mobile - direct version"""
 	frappe.logger().info(f"📱 Updating contact mobile to: {new_mobile}")
 	
-	# Check if mobile already exists
-	existing_mobile = None
+	# Check if mobile already exists, noting any primary mobile in the same pass
+	has_primary = False
 	for phone_row in contact_doc.phone_nos:
 		if phone_row.phone == new_mobile:
-			existing_mobile = phone_row
-			break
+			return
+		has_primary = has_primary or phone_row.get("is_primary_mobile_no")
 	
-	if not existing_mobile:
-		# Add new mobile
-		frappe.logger().info(f"➕ Adding new mobile: {new_mobile}")
-		contact_doc.append("phone_nos", {
-			"phone": new_mobile,
-			"is_primary_mobile_no": 1 if not any(p.get("is_primary_mobile_no") for p in contact_doc.phone_nos) else 0
-		}) 
\ No newline at end of file
+	# Add new mobile
+	frappe.logger().info(f"➕ Adding new mobile: {new_mobile}")
+	contact_doc.append("phone_nos", {
+		"phone": new_mobile,
+		"is_primary_mobile_no": 0 if has_primary else 1
+	}) 
\ No newline at end of file
@@ -1,21 +1,49 @@
+import csv
+import functools
+import hashlib
+from collections import defaultdict
+
 import frappe
 from frappe import _
-from frappe.utils import flt
-import json
+from frappe.desk.reportview import build_match_conditions
+from frappe.utils import cint, flt
+
+from crm.utils import bulk_delete_docs, get_all_with_children, parse_json_args, stream_csv_export
+
+# bulk_action name -> (kwarg carrying the value, CRM Lead field, message when it is missing)
+BULK_UPDATE_ACTIONS = {
+	"update_status": ("status", "status", "Status is required"),
+	"assign_owner": ("owner", "lead_owner", "Owner is required"),
+	"update_priority": ("priority", "priority", "Priority is required"),
+}
+
+# Seconds a get_list result without requirement data is served from cache, and the cache key
+# holding the version that lead writes bump to invalidate those results
+LIST_CACHE_TTL = 5
+LIST_CACHE_VERSION_KEY = "crm_lead_list_version"
+
+# Operators _get_leads_with_joins accepts in [operator, value] filters
+FILTER_OPERATORS = frozenset(["=", "!=", ">", "<", ">=", "<=", "like", "not like", "in", "not in"])
+
+# Doctypes that reference leads through a dynamic link: (doctype, reference doctype field, reference name field)
+LEAD_REFERENCES = (
+	("CRM Task", "reference_doctype", "reference_docname"),
+	("FCRM Note", "reference_doctype", "reference_docname"),
+	("CRM Call Log", "reference_doctype", "reference_docname"),
+	("CRM Notification", "reference_doctype", "reference_name"),
+)
 
 
 @frappe.whitelist()
+@parse_json_args("fields", "filters")
 def get_list(doctype="CRM Lead", fields=None, filters=None, order_by=None, 
-             limit_start=0, limit_page_length=20, parent_doctype=None, debug=False):
-	"""Get list of leads with linked requirement data using manual joins (same as get_leads_with_requirements)"""
-	
-	# Parse fields if it's a string
-	if isinstance(fields, str):
-		fields = json.loads(fields)
+             limit_start=0, limit_page_length=20, parent_doctype=None, debug=False, with_total=False):
+	"""
+	Get list of leads with linked requirement data using manual joins (same as get_leads_with_requirements).
+	With `with_total`, returns {"rows": [...], "total": n} so the UI can paginate without a get_count call.
+	"""
 	
-	# Parse filters if it's a string
-	if isinstance(filters, str):
-		filters = json.loads(filters) if filters else {}
+	filters = filters or {}
 	
 	# Default fields if not specified
 	if not fields:
@@ -31,16 +59,35 @@ def get_list(doctype="CRM Lead", fields=None, filters=None, order_by=None,
 	
 	# If no requirement fields/filters, use simple frappe.get_all for better performance
 	if not has_requirement_fields and not has_requirement_filters:
-		return frappe.get_all(
-			doctype,
-			fields=fields,
-			filters=filters,
-			order_by=order_by or "modified desc",
-			start=limit_start,
-			page_length=limit_page_length,
-			parent_doctype=parent_doctype,
-			debug=debug
-		)
+		def get_rows():
+			rows = frappe.get_all(
+				doctype,
+				fields=fields,
+				filters=filters,
+				order_by=order_by or "modified desc",
+				start=limit_start,
+				page_length=limit_page_length,
+				parent_doctype=parent_doctype,
+				debug=debug
+			)
+			if cint(with_total):
+				# get_all does not accept a window COUNT(*) OVER() field, so the total comes from the
+				# page itself when it is the last one and from a separate count otherwise
+				if len(rows) < cint(limit_page_length) and (rows or not cint(limit_start)):
+					total = cint(limit_start) + len(rows)
+				else:
+					total = frappe.db.count(doctype, filters=filters)
+				return {"rows": rows, "total": total}
+			return rows
+		
+		# Only lead writes invalidate the cache, so other doctypes are always read directly
+		if debug or doctype != "CRM Lead":
+			return get_rows()
+		
+		# Dashboards poll the same list every few seconds, so identical reads share a short-lived
+		# cache entry; any lead write bumps the version and invalidates every entry at once
+		params = [doctype, fields, filters, order_by, limit_start, limit_page_length, parent_doctype, with_total]
+		return _get_cached_list(params, get_rows)
 	
 	# Otherwise, use the internal join function
 	return _get_leads_with_joins(
@@ -48,18 +95,16 @@ def get_list(doctype="CRM Lead", fields=None, filters=None, order_by=None,
 		filters=filters,
 		order_by=order_by,
 		limit_start=limit_start,
-		limit_page_length=limit_page_length
+		limit_page_length=limit_page_length,
+		with_total=with_total
 	)
 
 
 @frappe.whitelist()
+@parse_json_args("fields")
 def get_view(name, fields=None):
 	"""Get single lead with all linked requirement data"""
 	
-	# Parse fields if it's a string
-	if isinstance(fields, str):
-		fields = json.loads(fields)
-	
 	# Get the lead document with specified fields
 	lead_fields = fields.get("lead", ["*"]) if fields else ["*"]
 	lead = frappe.get_doc("CRM Lead", name).as_dict()
@@ -67,89 +112,38 @@ def get_view(name, fields=None):
 	# Get linked requirements with their child tables
 	requirement_fields = fields.get("requirement", ["*"]) if fields else ["*"]
 	
-	# Add child table fields using dot notation
-	if "destination_city" not in requirement_fields:
-		requirement_fields.extend([
-			"destination_city.destination",
-			"destination_city.nights",
-			"destination_city.sequence"
-		])
-	if "passenger_details" not in requirement_fields:
-		requirement_fields.extend([
-			"passenger_details.passenger_type",
-			"passenger_details.age"
-		])
-	if "activity" not in requirement_fields:
-		requirement_fields.extend([
-			"activity.activity"
-		])
-	
-	# Get requirements with child data using frappe.get_all
-	requirements = frappe.get_all(
-		"Requirement",
-		filters={"lead": name},
-		fields=requirement_fields
-	)
-	
-	# Group child table data by parent requirement
-	requirements_dict = {}
-	for row in requirements:
-		req_name = row.get("name")
-		if req_name not in requirements_dict:
-			requirements_dict[req_name] = {
-				"name": req_name,
-				"destination_city": [],
-				"passenger_details": [],
-				"activity": []
-			}
-		
-		# Copy parent fields
-		for key, value in row.items():
-			if "." not in key and key not in ["destination_city", "passenger_details", "activity"]:
-				requirements_dict[req_name][key] = value
-		
-		# Handle child table data
-		for child_table in ["destination_city", "passenger_details", "activity"]:
-			child_data = {}
-			for key, value in row.items():
-				if key.startswith(f"{child_table}."):
-					field_name = key.split(".", 1)[1]
-					child_data[field_name] = value
-			
-			if child_data and any(v is not None for v in child_data.values()):
-				requirements_dict[req_name][child_table].append(child_data)
+	return _add_requirements_and_counts(lead, requirement_fields)
+
+
+def _add_requirements_and_counts(lead, requirement_fields=None):
+	"""Fills in the requirements, comment count and like count of a lead dict as get_view returns it"""
 	
-	lead["requirements"] = list(requirements_dict.values())
+	# Child tables are fetched with one query each rather than joined in, which would return
+	# one row per destination x passenger x activity combination
+	lead["requirements"] = get_all_with_children("Requirement", {"lead": lead.name}, fields=requirement_fields)
 	
 	# Add comment and like counts
 	try:
-		lead["_comment_count"] = frappe.db.count("Comment", {
-			"reference_doctype": "CRM Lead",
-			"reference_name": name
-		})
+		counts = frappe.db.sql("""
+			SELECT
+				(SELECT COUNT(*) FROM `tabComment`
+					WHERE reference_doctype = 'CRM Lead' AND reference_name = %(name)s) as comment_count,
+				(SELECT COUNT(*) FROM `tabLike Log`
+					WHERE reference_doctype = 'CRM Lead' AND reference_name = %(name)s) as like_count
+		""", {"name": lead.name}, as_dict=True)[0]
+		lead["_comment_count"] = counts.comment_count
+		lead["_like_count"] = counts.like_count
 	except:
 		lead["_comment_count"] = 0
-	
-	try:
-		lead["_like_count"] = frappe.db.count("Like Log", {
-			"reference_doctype": "CRM Lead",
-			"reference_name": name
-		})
-	except:
 		lead["_like_count"] = 0
 	
 	return lead
 
 
 @frappe.whitelist()
-def create(doc=None, with_requirement=False, requirement_data=None):
+@parse_json_args("doc", "requirement_data")
+def create(doc=None, with_requirement=False, requirement_data=None, return_full=False):
 	"""Create lead with optional requirement"""
-	if isinstance(doc, str):
-		doc = json.loads(doc)
-	
-	if isinstance(requirement_data, str):
-		requirement_data = json.loads(requirement_data)
-	
 	# Create the lead (fetch rules will automatically populate fields from contact)
 	lead = frappe.get_doc(doc)
 	lead.insert()
@@ -161,21 +155,20 @@ def create(doc=None, with_requirement=False, requirement_data=None):
 		req = frappe.get_doc(requirement_data)
 		req.insert()
 		
-		# Return lead with requirement
-		return get_view(lead.name)
+		if cint(return_full):
+			return get_view(lead.name)
+		
+		# A new lead has no other requirements, comments or likes, so the view is built from
+		# the inserted documents instead of being read back
+		return {**lead.as_dict(), "requirements": [req.as_dict()], "_comment_count": 0, "_like_count": 0}
 	
 	return lead.as_dict()
 
 
 @frappe.whitelist()
-def update(name, doc=None, update_requirement=False, requirement_data=None):
+@parse_json_args("doc", "requirement_data")
+def update(name, doc=None, update_requirement=False, requirement_data=None, return_full=False):
 	"""Update lead and optionally its requirement"""
-	if isinstance(doc, str):
-		doc = json.loads(doc)
-	
-	if isinstance(requirement_data, str):
-		requirement_data = json.loads(requirement_data)
-	
 	# Update the lead (fetch rules will update fields from contact if link_to_contact changes)
 	lead = frappe.get_doc("CRM Lead", name)
 	for key, value in doc.items():
@@ -193,85 +186,115 @@ def update(name, doc=None, update_requirement=False, requirement_data=None):
 					setattr(req, key, value)
 			req.save()
 	
-	return get_view(name)
+	if cint(return_full):
+		return get_view(name)
+	
+	# The saved lead is already in memory; only its requirements and counts are read back
+	return _add_requirements_and_counts(lead.as_dict())
 
 
 @frappe.whitelist()
-def delete(names):
+@parse_json_args("names")
+def delete(names, force_hooks=False):
 	"""Delete leads and their linked requirements"""
 	if isinstance(names, str):
-		names = json.loads(names) if "[" in names else [names]
+		names = [names]
 	
-	deleted = []
-	for name in names:
-		# Delete linked requirements first
-		requirements = frappe.get_all("Requirement", filters={"lead": name}, pluck="name")
-		for req in requirements:
+	if not names:
+		return {"deleted": []}
+	
+	if cint(force_hooks):
+		# Full delete_doc so controllers and on_trash hooks run
+		for req in frappe.get_all("Requirement", filters={"lead": ["in", names]}, pluck="name"):
 			frappe.delete_doc("Requirement", req)
-		
-		# Delete the lead
+		for name in names:
+			frappe.delete_doc("CRM Lead", name)
+		return {"deleted": names}
+	
+	permitted = [name for name in names if frappe.has_permission("CRM Lead", "delete", name)]
+	if not permitted:
+		return {"deleted": []}
+	
+	# Linked requirements go first, then the leads, each with one DELETE per table; requirement
+	# child rows are matched through a subquery so requirement names never round-trip
+	frappe.has_permission("Requirement", "delete", throw=True)
+	for df in frappe.get_meta("Requirement").get_table_fields():
+		frappe.db.sql(f"""
+			DELETE FROM `tab{df.options}`
+			WHERE parenttype = 'Requirement'
+				AND parent IN (SELECT name FROM `tabRequirement` WHERE lead IN %s)
+		""", [permitted])
+	frappe.db.delete("Requirement", {"lead": ["in", permitted]})
+	
+	# Leads converted to deals or referenced by other CRM records still go through delete_doc
+	# so link checks apply
+	linked = get_linked_leads(permitted)
+	bulk_delete_docs("CRM Lead", [name for name in permitted if name not in linked])
+	clear_list_cache()
+	for name in linked:
 		frappe.delete_doc("CRM Lead", name)
-		deleted.append(name)
 	
-	return {"deleted": deleted}
+	return {"deleted": permitted}
+
+
+def get_linked_leads(names):
+	"""Returns the leads among `names` that a deal links to or another CRM record references"""
+	linked = set(frappe.get_all("CRM Deal", filters={"lead": ["in", names]}, pluck="lead", distinct=True))
+	for reference_doctype, doctype_field, name_field in LEAD_REFERENCES:
+		linked.update(frappe.get_all(
+			reference_doctype,
+			filters={doctype_field: "CRM Lead", name_field: ["in", names]},
+			pluck=name_field,
+			distinct=True
+		))
+	return linked
 
 
 @frappe.whitelist()
+@parse_json_args("names")
 def bulk_action(action, names, **kwargs):
 	"""Handle bulk actions for leads"""
 	if isinstance(names, str):
-		names = json.loads(names)
+		names = [names]
 	
 	results = {"success": [], "failed": []}
 	
 	if action == "delete":
-		return delete(names)
+		return delete(names, kwargs.get("force_hooks"))
 	
-	elif action == "update_status":
-		status = kwargs.get("status")
-		if not status:
-			frappe.throw(_("Status is required"))
+	elif action in BULK_UPDATE_ACTIONS:
+		kwarg, fieldname, required_message = BULK_UPDATE_ACTIONS[action]
+		value = kwargs.get(kwarg)
+		if not value:
+			frappe.throw(_(required_message))
 		
-		for name in names:
-			try:
-				lead = frappe.get_doc("CRM Lead", name)
-				lead.status = status
-				lead.save()
-				results["success"].append(name)
-			except Exception as e:
-				results["failed"].append({"name": name, "error": str(e)})
-		
-		return results
-	
-	elif action == "assign_owner":
-		owner = kwargs.get("owner")
-		if not owner:
-			frappe.throw(_("Owner is required"))
+		# Every lead gets the same value, so it is validated once here rather than by each save
+		_validate_lead_field_value(fieldname, value)
 		
 		for name in names:
-			try:
-				lead = frappe.get_doc("CRM Lead", name)
-				lead.lead_owner = owner
-				lead.save()
+			if frappe.has_permission("CRM Lead", "write", name):
 				results["success"].append(name)
-			except Exception as e:
-				results["failed"].append({"name": name, "error": str(e)})
+			else:
+				results["failed"].append({"name": name, "error": _("Not permitted")})
 		
-		return results
-	
-	elif action == "update_priority":
-		priority = kwargs.get("priority")
-		if not priority:
-			frappe.throw(_("Priority is required"))
+		if not results["success"]:
+			return results
 		
-		for name in names:
-			try:
-				lead = frappe.get_doc("CRM Lead", name)
-				lead.priority = priority
-				lead.save()
-				results["success"].append(name)
-			except Exception as e:
-				results["failed"].append({"name": name, "error": str(e)})
+		if action != "update_priority" or cint(kwargs.get("force_hooks")):
+			# Full save so validate can log status changes and share or assign the new owner
+			permitted, results["success"] = results["success"], []
+			for name in permitted:
+				try:
+					lead = frappe.get_doc("CRM Lead", name)
+					lead.set(fieldname, value)
+					lead.save()
+					results["success"].append(name)
+				except Exception as e:
+					results["failed"].append({"name": name, "error": str(e)})
+		else:
+			# Priority has no validate side effects, so one UPDATE replaces a load and save per lead
+			frappe.db.set_value("CRM Lead", {"name": ["in", results["success"]]}, fieldname, value)
+			clear_list_cache()
 		
 		return results
 	
@@ -279,23 +302,49 @@ def bulk_action(action, names, **kwargs):
 		frappe.throw(_("Invalid action: {0}").format(action))
 
 
+def _validate_lead_field_value(fieldname, value):
+	"""Checks a value against a CRM Lead Link or Select field the way a save would"""
+	df = frappe.get_meta("CRM Lead").get_field(fieldname)
+	if not df:
+		return
+	
+	if df.fieldtype == "Link" and not frappe.db.exists(df.options, value):
+		frappe.throw(
+			_("Could not find {0}: {1}").format(_(df.options), value),
+			frappe.LinkValidationError
+		)
+	
+	if df.fieldtype == "Select" and df.options and value not in df.options.split("\n"):
+		frappe.throw(_("{0} cannot be {1}").format(_(df.label), value))
+
+
 @frappe.whitelist()
-def export(fields=None, filters=None, file_type="CSV"):
-	"""Export leads with requirement data"""
+@parse_json_args("fields", "filters")
+def export(fields=None, filters=None, file_type="CSV", background=False):
+	"""
+	Export leads with requirement data. With `background`, the CSV is written by a job on the long
+	queue instead of the web worker; the response carries the job ID and the user gets a
+	`lead_export_ready` realtime event with the file URL when it is done.
+	"""
 	from frappe.desk.reportview import export_query
+	from frappe.permissions import can_export
 	
-	# Parse parameters
-	if isinstance(fields, str):
-		fields = json.loads(fields)
-	if isinstance(filters, str):
-		filters = json.loads(filters) if filters else {}
+	filters = filters or {}
 	
-	# Get all data without pagination
-	data = get_list(
-		fields=fields,
-		filters=filters,
-		limit_page_length=None
-	)
+	if cint(background):
+		can_export("CRM Lead", raise_exception=True)
+		job = frappe.enqueue(
+			"crm.api.lead_with_requirements.run_export",
+			queue="long",
+			timeout=3600,
+			fields=fields,
+			filters=filters
+		)
+		return {"job_id": job.id}
+	
+	# Plain lead columns can be streamed page by page instead of building the whole file in memory
+	if file_type == "CSV" and fields and not any(f.startswith("requirement.") for f in fields):
+		return stream_csv_export("CRM Lead", fields, filters)
 	
 	# Use Frappe's built-in export
 	return export_query(
@@ -307,6 +356,45 @@ def export(fields=None, filters=None, file_type="CSV"):
 	)
 
 
+def run_export(fields=None, filters=None, page_size=1000):
+	"""
+	Background job for export(background=True): writes the rows to a private CSV File,
+	appending each keyset-paginated page to the file on disk as it is read
+	"""
+	fields = fields or ["name", "lead_name", "status", "email", "mobile_no"]
+	file_name = f"crm_lead_export_{frappe.generate_hash(length=8)}.csv"
+	
+	with open(frappe.get_site_path("private", "files", file_name), "w", newline="") as f:
+		writer = csv.writer(f)
+		writer.writerow(fields)
+		
+		# One query shape serves plain and requirement columns; each page starts after the
+		# (lead, requirement) pair of the last row, so no page re-reads the rows before it
+		cursor = ()
+		while True:
+			rows = _get_leads_with_joins(
+				fields=fields,
+				filters=filters,
+				limit_page_length=page_size,
+				cursor=cursor
+			)
+			writer.writerows([row.get(field) for field in fields] for row in rows)
+			
+			if len(rows) < page_size:
+				break
+			cursor = (rows[-1]._cursor_lead, rows[-1]._cursor_requirement)
+	
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": f"/private/files/{file_name}",
+		"is_private": 1
+	}).insert(ignore_permissions=True)
+	
+	frappe.publish_realtime("lead_export_ready", {"file_url": file_doc.file_url}, user=frappe.session.user)
+	return file_doc.file_url
+
+
 @frappe.whitelist()
 def import_data(file_url=None, data=None, import_type="Insert New Records"):
 	"""Import leads with requirements"""
@@ -350,38 +438,35 @@ def import_data(file_url=None, data=None, import_type="Insert New Records"):
 
 
 @frappe.whitelist()
+@parse_json_args("filters")
 def get_count(filters=None):
 	"""Get count of leads matching filters"""
-	if isinstance(filters, str):
-		filters = json.loads(filters) if filters else {}
-	
-	count = frappe.db.count("CRM Lead", filters=filters)
+	filters = filters or {}
 	
-	# Get counts by status
-	status_counts = frappe.db.sql("""
-		SELECT status, COUNT(*) as count
-		FROM `tabCRM Lead`
-		WHERE {conditions}
-		GROUP BY status
-	""".format(
-		conditions=" AND ".join([f"{k} = %({k})s" for k in filters.keys()]) if filters else "1=1"
-	), filters, as_dict=True)
+	# One grouped scan gives both the per-status counts and the total; the filters go through
+	# the query builder, so their fields are validated and their values bound as parameters
+	status_counts = frappe.get_all(
+		"CRM Lead",
+		filters=filters,
+		fields=["status", "count(*) as count"],
+		group_by="status"
+	)
 	
 	return {
-		"total": count,
+		"total": sum(row.count for row in status_counts),
 		"by_status": {row.status: row.count for row in status_counts}
 	}
 
 
 @frappe.whitelist()
+@parse_json_args("filters")
 def get_stats(filters=None):
 	"""Get statistics for leads"""
-	if isinstance(filters, str):
-		filters = json.loads(filters) if filters else {}
+	filters = filters or {}
 	
 	# Base stats
 	stats = {
-		"total_leads": frappe.db.count("CRM Lead", filters=filters),
+		"total_leads": 0,
 		"total_requirements": 0,
 		"avg_budget": 0,
 		"by_status": {},
@@ -391,36 +476,38 @@ def get_stats(filters=None):
 		"conversion_rate": 0
 	}
 	
-	# Get leads matching filters
-	lead_names = frappe.get_all("CRM Lead", filters=filters, pluck="name")
+	# One grouped scan of the matching leads gives the total and every per-field breakdown
+	group_fields = ["status", "priority", "source"]
+	grouped = frappe.get_all(
+		"CRM Lead",
+		filters=filters,
+		fields=[*group_fields, "count(*) as count"],
+		group_by=", ".join(group_fields)
+	)
+	
+	by_field = {field: defaultdict(int) for field in group_fields}
+	for row in grouped:
+		stats["total_leads"] += row.count
+		for field in group_fields:
+			if row[field]:
+				by_field[field][row[field]] += row.count
+	for field, counts in by_field.items():
+		stats[f"by_{field}"] = dict(counts)
+	
+	# Get leads matching filters; the grouped counts already say whether there are any
+	lead_names = frappe.get_all("CRM Lead", filters=filters, pluck="name") if stats["total_leads"] else []
 	
 	if lead_names:
-		# Count requirements
-		stats["total_requirements"] = frappe.db.count(
-			"Requirement", 
-			filters={"lead": ["in", lead_names]}
-		)
-		
-		# Average budget from requirements
-		avg_budget = frappe.db.sql("""
-			SELECT AVG(budget) as avg_budget
+		# Count requirements and average their budget in one scan
+		requirement_stats = frappe.db.sql("""
+			SELECT COUNT(*) as total, AVG(CASE WHEN budget > 0 THEN budget END) as avg_budget
 			FROM `tabRequirement`
-			WHERE lead IN %s AND budget > 0
-		""", [lead_names], as_dict=True)
+			WHERE lead IN %s
+		""", [lead_names], as_dict=True)[0]
 		
-		if avg_budget and avg_budget[0].avg_budget:
-			stats["avg_budget"] = flt(avg_budget[0].avg_budget, 2)
-		
-		# Group by various fields
-		for field in ["status", "priority", "source"]:
-			field_counts = frappe.db.sql("""
-				SELECT {field}, COUNT(*) as count
-				FROM `tabCRM Lead`
-				WHERE name IN %s
-				GROUP BY {field}
-			""".format(field=field), [lead_names], as_dict=True)
-			
-			stats[f"by_{field}"] = {row[field]: row.count for row in field_counts if row[field]}
+		stats["total_requirements"] = requirement_stats.total
+		if requirement_stats.avg_budget:
+			stats["avg_budget"] = flt(requirement_stats.avg_budget, 2)
 		
 		# Service type stats (from child table)
 		service_counts = frappe.db.sql("""
@@ -433,28 +520,43 @@ def get_stats(filters=None):
 		stats["by_service_type"] = {row.service_type: row.count for row in service_counts}
 		
 		# Conversion rate (converted leads / total leads)
-		converted_count = frappe.db.count(
-			"CRM Lead", 
-			filters={"name": ["in", lead_names], "status": "Converted"}
-		)
-		stats["conversion_rate"] = round((converted_count / stats["total_leads"]) * 100, 2) if stats["total_leads"] > 0 else 0
+		converted_count = stats["by_status"].get("Converted", 0)
+		stats["conversion_rate"] = round((converted_count / stats["total_leads"]) * 100, 2)
 	
 	return stats
 
 
+def _get_cached_list(params, generator):
+	"""Returns the cached result of a list read for these parameters, running `generator` on a miss"""
+	cache = frappe.cache()
+	version = cache.get_value(LIST_CACHE_VERSION_KEY) or ""
+	key = f"crm_lead_list:{version}:{hashlib.sha1(frappe.as_json(params).encode()).hexdigest()}"
+	
+	result = cache.get_value(key, user=frappe.session.user, expires=True)
+	if result is None:
+		result = generator()
+		cache.set_value(key, result, user=frappe.session.user, expires_in_sec=LIST_CACHE_TTL)
+	
+	return result
+
+
+def clear_list_cache(doc=None, method=None):
+	"""Invalidates every cached get_list result; CRM Lead on_update/on_trash hook and bulk writes"""
+	frappe.cache().set_value(LIST_CACHE_VERSION_KEY, frappe.generate_hash(length=10))
+
+
 def _get_leads_with_joins(fields=None, filters=None, order_by=None, 
-                         limit_start=0, limit_page_length=20):
+                         limit_start=0, limit_page_length=20, with_total=False, cursor=None):
 	"""
 	Internal function to get leads with their linked requirements using manual joins.
 	Used by get_list when requirement fields/filters are detected.
+	Rows are one per lead/requirement pair; with `with_total` the number of such rows
+	across all pages is computed by the same query and returned alongside the page.
+	A `cursor` (empty for the first page) switches to keyset pagination: rows are ordered by
+	(lead, requirement), start after the given pair and carry `_cursor_lead` and
+	`_cursor_requirement` for the next page.
 	"""
 	
-	if isinstance(fields, str):
-		fields = json.loads(fields)
-	
-	if isinstance(filters, str):
-		filters = json.loads(filters) if filters else {}
-	
 	# Default fields if not specified
 	if not fields:
 		fields = ["name", "lead_name", "status", "email", "mobile_no"]
@@ -472,63 +574,107 @@ def _get_leads_with_joins(fields=None, filters=None, order_by=None,
 	
 	# Build the query
 	select_fields = lead_fields + requirement_fields
+	if cint(with_total):
+		# Window count is evaluated before LIMIT, so the page query also yields the total
+		select_fields.append("COUNT(*) OVER() as _total_count")
 	
+	# Add filters; the SQL fragment depends only on the filters' shape, so it is compiled once
+	# per shape and only the values are collected per call
+	conditions = []
+	if filters:
+		shape, values = _filter_shape(filters)
+		conditions.append(f"({_compile_filter_conditions(shape)})")
+	else:
+		values = []
+	
+	# The raw query bypasses get_list, so apply the same permission checks and match conditions;
+	# these reference `tabCRM Lead` and arrive with % already escaped for the values pass
+	frappe.has_permission("CRM Lead", "read", throw=True)
+	match_conditions = build_match_conditions("CRM Lead")
+	if match_conditions:
+		conditions.append(f"({match_conditions.replace('`tabCRM Lead`.', 'l.')})")
+	
+	if cursor is not None:
+		# Leads without requirements have a NULL r.name, which sorts and compares as ''
+		select_fields += ["l.name as _cursor_lead", "COALESCE(r.name, '') as _cursor_requirement"]
+		order_by = "l.name ASC, _cursor_requirement ASC"
+		limit_start = 0
+		if cursor:
+			conditions.append("(l.name, COALESCE(r.name, '')) > (%s, %s)")
+			values = [*values, *cursor]
+	
+	where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+	
+	# Assemble the statement in one pass
 	query = f"""
 		SELECT 
 			{', '.join(select_fields)}
 		FROM `tabCRM Lead` l
 		LEFT JOIN `tabRequirement` r ON r.lead = l.name
+		{where}
+		ORDER BY {order_by or "l.modified DESC"}
+		LIMIT {limit_start}, {limit_page_length}
 	"""
 	
-	# Add filters
-	conditions = []
-	values = []
+	# Execute query
+	results = frappe.db.sql(query, values, as_dict=True)
 	
-	if filters:
-		for key, value in filters.items():
-			# Determine table alias (l for lead, r for requirement)
-			if key.startswith("requirement."):
-				table_alias = "r"
-				field_name = key.replace("requirement.", "")
-			else:
-				table_alias = "l"
-				field_name = key
-			
-			if isinstance(value, list) and len(value) == 2 and value[0] in ["=", "!=", ">", "<", ">=", "<=", "like", "not like", "in", "not in"]:
-				operator = value[0]
-				val = value[1]
-				if operator in ["in", "not in"]:
-					if isinstance(val, list):
-						placeholders = ', '.join(['%s'] * len(val))
-						conditions.append(f"{table_alias}.{field_name} {operator} ({placeholders})")
-						values.extend(val)
-					else:
-						conditions.append(f"{table_alias}.{field_name} {operator} (%s)")
-						values.append(val)
+	if cint(with_total):
+		total = results[0]._total_count if results else 0
+		for row in results:
+			del row["_total_count"]
+		return {"rows": results, "total": total}
+	
+	return results
+
+
+def _filter_shape(filters):
+	"""
+	Splits `_get_leads_with_joins` filters into a hashable shape - (key, operator, placeholder
+	count) per filter, with None for a single bare placeholder - and the values to bind.
+	"""
+	shape = []
+	values = []
+	for key, value in filters.items():
+		if isinstance(value, list) and len(value) == 2 and value[0] in FILTER_OPERATORS:
+			operator, val = value
+			if operator in ("in", "not in"):
+				if isinstance(val, list):
+					shape.append((key, operator, len(val)))
+					values.extend(val)
 				else:
-					conditions.append(f"{table_alias}.{field_name} {operator} %s")
+					shape.append((key, operator, 1))
 					values.append(val)
-			elif isinstance(value, list):
-				placeholders = ', '.join(['%s'] * len(value))
-				conditions.append(f"{table_alias}.{field_name} IN ({placeholders})")
-				values.extend(value)
 			else:
-				conditions.append(f"{table_alias}.{field_name} = %s")
-				values.append(value)
-	
-	if conditions:
-		query += f" WHERE {' AND '.join(conditions)}"
-	
-	# Add order by
-	if order_by:
-		query += f" ORDER BY {order_by}"
-	else:
-		query += " ORDER BY l.modified DESC"
-	
-	# Add limit
-	query += f" LIMIT {limit_start}, {limit_page_length}"
+				shape.append((key, operator, None))
+				values.append(val)
+		elif isinstance(value, list):
+			shape.append((key, "IN", len(value)))
+			values.extend(value)
+		else:
+			shape.append((key, "=", None))
+			values.append(value)
 	
-	# Execute query
-	results = frappe.db.sql(query, values, as_dict=True)
+	return tuple(shape), values
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_filter_conditions(shape):
+	"""Builds the WHERE conditions for a filter shape from `_filter_shape`"""
+	conditions = []
+	for key, operator, placeholder_count in shape:
+		# Determine table alias (l for lead, r for requirement)
+		if key.startswith("requirement."):
+			table_alias = "r"
+			field_name = key.replace("requirement.", "")
+		else:
+			table_alias = "l"
+			field_name = key
+		
+		if placeholder_count is None:
+			conditions.append(f"{table_alias}.{field_name} {operator} %s")
+		else:
+			placeholders = ', '.join(['%s'] * placeholder_count)
+			conditions.append(f"{table_alias}.{field_name} {operator} ({placeholders})")
 	
-	return results
\ No newline at end of file
+	return " AND ".join(conditions)
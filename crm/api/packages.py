@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 import frappe
 from frappe import _
 
@@ -19,20 +21,23 @@ def get_packages_with_destinations():
         limit=100
     )
 
-    # For each package, get its destinations
-    for pkg in packages:
-        # Get destinations child table
+    # Get the destinations of all packages in one query and group them by package
+    destinations_by_package = defaultdict(list)
+    if packages:
         destinations = frappe.get_all(
             "Trip Destination",
-            filters={"parent": pkg["name"], "parenttype": "Standard Package"},
-            fields=["destination", "nights", "sequence"],
-            order_by="idx"
+            filters={"parent": ["in", [pkg["name"] for pkg in packages]], "parenttype": "Standard Package"},
+            fields=["parent", "destination", "nights", "sequence"],
+            order_by="parent, idx"
         )
+        for destination in destinations:
+            destinations_by_package[destination.pop("parent")].append(destination)
 
+    for pkg in packages:
         # Add destinations list to package
-        pkg["destinations"] = destinations
+        pkg["destinations"] = destinations_by_package[pkg["name"]]
 
         # Create a comma-separated string for easy display
-        pkg["destinations_text"] = ", ".join([d["destination"] for d in destinations])
+        pkg["destinations_text"] = ", ".join(d["destination"] for d in pkg["destinations"])
 
-    return packages
\ No newline at end of file
+    return packages
@@ -0,0 +1,130 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import csv
+import io
+from unittest.mock import patch
+
+import frappe
+from frappe.model import default_fields
+from frappe.tests import IntegrationTestCase
+
+from crm.api.lead import bulk_actions, export_data
+from crm.utils import _generate_csv_rows
+
+
+def make_lead(**kwargs):
+	contact = frappe.get_doc({"doctype": "Contact", "first_name": "_Test Lead"}).insert()
+	return frappe.get_doc(
+		{
+			"doctype": "CRM Lead",
+			"first_name": "_Test Lead",
+			"email": f"{frappe.generate_hash(length=10)}@example.com",
+			"link_to_contact": contact.name,
+			**kwargs,
+		}
+	).insert()
+
+
+def make_task(lead):
+	return frappe.get_doc(
+		{
+			"doctype": "CRM Task",
+			"title": "_Test Lead Task",
+			"reference_doctype": "CRM Lead",
+			"reference_docname": lead,
+		}
+	).insert()
+
+
+def make_deal(lead):
+	return frappe.get_doc({"doctype": "CRM Deal", "lead": lead}).insert(
+		ignore_mandatory=True, ignore_links=True
+	)
+
+
+class IntegrationTestLeadExport(IntegrationTestCase):
+	def test_default_export_uses_exporter(self):
+		with (
+			patch("crm.api.lead.stream_csv_export") as stream_csv_export,
+			patch("frappe.core.doctype.data_import.exporter.Exporter") as exporter,
+		):
+			export_data()
+
+		stream_csv_export.assert_not_called()
+		self.assertEqual(exporter.call_args.kwargs["doctype"], "CRM Lead")
+		exporter.return_value.build_response.assert_called_once()
+
+	def test_streamed_csv_export_keeps_only_existing_fields(self):
+		with patch("crm.api.lead.stream_csv_export") as stream_csv_export:
+			export_data(stream=1)
+
+		doctype, fields, _filters = stream_csv_export.call_args.args
+		meta = frappe.get_meta("CRM Lead")
+		self.assertEqual(doctype, "CRM Lead")
+		self.assertIn("name", fields)
+		self.assertIn("lead_name", fields)
+		self.assertNotIn("trip_name", fields)
+		self.assertTrue(all(field in default_fields or meta.has_field(field) for field in fields))
+
+	def test_stream_with_child_table_fields_uses_exporter(self):
+		export_fields = {"Contact": ["first_name"], "Contact Email": ["email_id"]}
+		with (
+			patch("crm.api.lead.stream_csv_export") as stream_csv_export,
+			patch("frappe.core.doctype.data_import.exporter.Exporter") as exporter,
+		):
+			export_data(doctype="Contact", export_fields=export_fields, stream=1)
+
+		stream_csv_export.assert_not_called()
+		self.assertEqual(exporter.call_args.kwargs["export_fields"], export_fields)
+
+	def test_generate_csv_rows_pages_through_all_rows(self):
+		names = sorted(
+			frappe.get_doc({"doctype": "ToDo", "description": f"_Test Streamed Export {i}"}).insert().name
+			for i in range(3)
+		)
+
+		with (
+			patch("frappe.init"),
+			patch("frappe.connect"),
+			patch("frappe.set_user"),
+			patch("frappe.destroy") as destroy,
+		):
+			chunks = list(
+				_generate_csv_rows(
+					frappe.local.site,
+					frappe.session.user,
+					"ToDo",
+					["description"],
+					[["name", "in", names]],
+					page_size=2,
+				)
+			)
+
+		destroy.assert_called_once()
+		rows = list(csv.reader(io.StringIO("".join(chunks))))
+		self.assertEqual(rows[0], ["description"])
+		self.assertEqual(
+			rows[1:],
+			[[frappe.db.get_value("ToDo", name, "description")] for name in names],
+		)
+
+
+class IntegrationTestLeadBulkActions(IntegrationTestCase):
+	def test_delete_falls_back_to_delete_doc_for_linked_leads(self):
+		unlinked = make_lead().name
+		task_linked = make_lead().name
+		deal_linked = make_lead().name
+		make_task(task_linked)
+		make_deal(deal_linked)
+
+		with patch("frappe.delete_doc") as delete_doc:
+			bulk_actions("delete", [unlinked, task_linked, deal_linked])
+
+		self.assertFalse(frappe.db.exists("CRM Lead", unlinked))
+		self.assertTrue(frappe.db.exists("CRM Lead", task_linked))
+		self.assertTrue(frappe.db.exists("CRM Lead", deal_linked))
+		self.assertCountEqual(
+			[call.args[1] for call in delete_doc.call_args_list if call.args[0] == "CRM Lead"],
+			[task_linked, deal_linked],
+		)
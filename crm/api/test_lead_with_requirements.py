@@ -0,0 +1,66 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import IntegrationTestCase
+
+from crm.api.lead_with_requirements import bulk_action, delete, get_count, get_stats
+from crm.api.test_lead import make_deal, make_lead, make_task
+
+
+class IntegrationTestLeadWithRequirements(IntegrationTestCase):
+	def test_delete_falls_back_to_delete_doc_for_linked_leads(self):
+		unlinked = make_lead().name
+		task_linked = make_lead().name
+		deal_linked = make_lead().name
+		make_task(task_linked)
+		make_deal(deal_linked)
+
+		with patch("frappe.delete_doc") as delete_doc:
+			result = delete([unlinked, task_linked, deal_linked])
+
+		self.assertEqual(result["deleted"], [unlinked, task_linked, deal_linked])
+		self.assertFalse(frappe.db.exists("CRM Lead", unlinked))
+		self.assertCountEqual(
+			[call.args[1] for call in delete_doc.call_args_list if call.args[0] == "CRM Lead"],
+			[task_linked, deal_linked],
+		)
+
+	def test_bulk_update_priority_sets_value_once(self):
+		names = [make_lead(priority="Low").name for _ in range(2)]
+
+		with patch("frappe.db.set_value", wraps=frappe.db.set_value) as set_value:
+			result = bulk_action("update_priority", names, priority="High")
+
+		self.assertEqual(result, {"success": names, "failed": []})
+		set_value.assert_called_once()
+		self.assertEqual(
+			frappe.get_all("CRM Lead", filters={"name": ["in", names]}, pluck="priority"), ["High", "High"]
+		)
+
+	def test_bulk_update_rejects_invalid_values(self):
+		name = make_lead(priority="Low").name
+
+		self.assertRaises(frappe.ValidationError, bulk_action, "update_priority", [name], priority="Urgent")
+		self.assertRaises(
+			frappe.LinkValidationError, bulk_action, "assign_owner", [name], owner="_test_missing@example.com"
+		)
+		self.assertEqual(frappe.db.get_value("CRM Lead", name, "priority"), "Low")
+
+	def test_counts_and_stats_group_matching_leads(self):
+		names = [
+			make_lead(priority="High").name,
+			make_lead(priority="High").name,
+			make_lead(priority="Low").name,
+		]
+		filters = {"name": ["in", names]}
+
+		self.assertEqual(get_count(filters), {"total": 3, "by_status": {"New": 3}})
+
+		stats = get_stats(filters)
+		self.assertEqual(stats["total_leads"], 3)
+		self.assertEqual(stats["by_status"], {"New": 3})
+		self.assertEqual(stats["by_priority"], {"High": 2, "Low": 1})
+		self.assertEqual(stats["conversion_rate"], 0)
@@ -3,10 +3,64 @@ API endpoints for AI Agent Test Simulation
 """
 
 import frappe
-from typing import Dict, Any
+import functools
+import hashlib
+from typing import Dict, Any, Callable
 from crm.api.test_simulation_manager import TestSimulationManager
 
+# Seconds during which a repeat of the same endpoint error is not logged again
+ERROR_LOG_SUPPRESS_SECONDS = 60
+
+def _api_endpoint(action: str) -> Callable:
+    """
+    Wrap a test simulation endpoint so any exception is returned as {"success": False, "error": ...}
+    and logged as "Error <action>: <error>". Identical errors from the same endpoint are logged
+    once per ERROR_LOG_SUPPRESS_SECONDS, so a failing dependency (e.g. WhatsApp being down) does
+    not flood the Error Log
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                _log_error_once(fn.__name__, f"Error {action}: {str(e)}")
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
+
+        return wrapper
+
+    return decorator
+
+def _log_error_once(endpoint: str, message: str) -> None:
+    """Log an endpoint error unless the same one was already logged within the suppression window"""
+    signature = hashlib.sha1(f"{endpoint}:{message[:200]}".encode()).hexdigest()
+    key = f"test_simulation_error:{signature}"
+    if frappe.cache().get_value(key):
+        return
+
+    frappe.cache().set_value(key, 1, expires_in_sec=ERROR_LOG_SUPPRESS_SECONDS)
+    frappe.log_error(message, "Test Simulation API")
+
+def _get_manager(session_id: str = None) -> TestSimulationManager:
+    """
+    Get the TestSimulationManager for a session, reusing it for the rest of the request.
+    Calls without a session ID always get a new manager, since that starts a new session
+    """
+    if not session_id:
+        return TestSimulationManager()
+
+    managers = getattr(frappe.local, "test_simulation_managers", None)
+    if managers is None:
+        managers = frappe.local.test_simulation_managers = {}
+    if session_id not in managers:
+        managers[session_id] = TestSimulationManager(session_id=session_id)
+    return managers[session_id]
+
 @frappe.whitelist()
+@_api_endpoint("creating test session")
 def create_test_session() -> Dict[str, Any]:
     """
     Create a new test simulation session
@@ -14,22 +68,16 @@ def create_test_session() -> Dict[str, Any]:
     Returns:
         Dict with session details
     """
-    try:
-        manager = TestSimulationManager()
-        return {
-            "success": True,
-            "session_id": manager.session_id,
-            "user": manager.user,
-            "message": "Test session created successfully"
-        }
-    except Exception as e:
-        frappe.log_error(f"Error creating test session: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    manager = TestSimulationManager()
+    return {
+        "success": True,
+        "session_id": manager.session_id,
+        "user": manager.user,
+        "message": "Test session created successfully"
+    }
 
 @frappe.whitelist()
+@_api_endpoint("creating test customer")
 def create_test_customer(
     name: str,
     email: str = None,
@@ -50,27 +98,20 @@ def create_test_customer(
     Returns:
         Dict with created customer details
     """
-    try:
-        manager = TestSimulationManager(session_id=session_id)
-
-        customer_data = {
-            "name": name,
-            "email": email,
-            "phone": phone,
-            "additional_fields": kwargs
-        }
+    manager = _get_manager(session_id)
 
-        result = manager.create_test_customer(customer_data)
-        return result
+    customer_data = {
+        "name": name,
+        "email": email,
+        "phone": phone,
+        "additional_fields": kwargs
+    }
 
-    except Exception as e:
-        frappe.log_error(f"Error creating test customer: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    result = manager.create_test_customer(customer_data)
+    return result
 
 @frappe.whitelist()
+@_api_endpoint("sending test message")
 def send_test_message(
     customer_id: str,
     message: str,
@@ -91,45 +132,38 @@ def send_test_message(
     Returns:
         Dict with message status
     """
-    try:
-        if not message:
-            return {
-                "success": False,
-                "error": "Message is required"
-            }
-
-        manager = TestSimulationManager(session_id=session_id)
+    if not message:
+        return {
+            "success": False,
+            "error": "Message is required"
+        }
 
-        # Handle auto-creation of test customer
-        if customer_id == 'auto-create' or not customer_id:
-            # Create a new test customer
-            if not customer_info:
-                customer_info = {}
+    manager = _get_manager(session_id)
 
-            customer_data = {
-                "name": customer_info.get("name", "Test Customer"),
-                "email": customer_info.get("email"),
-                "phone": customer_info.get("phone")
-            }
+    # Handle auto-creation of test customer
+    if customer_id == 'auto-create' or not customer_id:
+        # Create a new test customer
+        if not customer_info:
+            customer_info = {}
 
-            customer_result = manager.create_test_customer(customer_data)
-            if not customer_result.get("success"):
-                return customer_result
+        customer_data = {
+            "name": customer_info.get("name", "Test Customer"),
+            "email": customer_info.get("email"),
+            "phone": customer_info.get("phone")
+        }
 
-            customer_id = customer_result["customer_id"]
+        customer_result = manager.create_test_customer(customer_data)
+        if not customer_result.get("success"):
+            return customer_result
 
-        result = manager.send_test_message(customer_id, message, channel)
-        result["customer_id"] = customer_id  # Include customer ID in response
-        return result
+        customer_id = customer_result["customer_id"]
 
-    except Exception as e:
-        frappe.log_error(f"Error sending test message: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    result = manager.send_test_message(customer_id, message, channel)
+    result["customer_id"] = customer_id  # Include customer ID in response
+    return result
 
 @frappe.whitelist()
+@_api_endpoint("getting test conversations")
 def get_test_conversations(
     customer_id: str = None,
     session_id: str = None,
@@ -146,25 +180,18 @@ def get_test_conversations(
     Returns:
         Dict with conversation messages
     """
-    try:
-        manager = TestSimulationManager(session_id=session_id)
-        conversations = manager.get_test_conversations(customer_id, limit)
+    manager = _get_manager(session_id)
+    conversations = manager.get_test_conversations(customer_id, limit)
 
-        return {
-            "success": True,
-            "conversations": conversations,
-            "count": len(conversations),
-            "session_id": manager.session_id
-        }
-
-    except Exception as e:
-        frappe.log_error(f"Error getting test conversations: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    return {
+        "success": True,
+        "conversations": conversations,
+        "count": len(conversations),
+        "session_id": manager.session_id
+    }
 
 @frappe.whitelist()
+@_api_endpoint("cleaning up test session")
 def cleanup_test_session(session_id: str) -> Dict[str, Any]:
     """
     Clean up all test data for a specific session
@@ -175,25 +202,18 @@ def cleanup_test_session(session_id: str) -> Dict[str, Any]:
     Returns:
         Dict with cleanup status
     """
-    try:
-        if not session_id:
-            return {
-                "success": False,
-                "error": "Session ID is required"
-            }
-
-        manager = TestSimulationManager(session_id=session_id)
-        result = manager.cleanup_test_session()
-        return result
-
-    except Exception as e:
-        frappe.log_error(f"Error cleaning up test session: {str(e)}", "Test Simulation API")
+    if not session_id:
         return {
             "success": False,
-            "error": str(e)
+            "error": "Session ID is required"
         }
 
+    manager = _get_manager(session_id)
+    result = manager.cleanup_test_session()
+    return result
+
 @frappe.whitelist()
+@_api_endpoint("cleaning up all test data")
 def cleanup_all_test_data() -> Dict[str, Any]:
     """
     Clean up ALL test data across all sessions
@@ -202,25 +222,18 @@ def cleanup_all_test_data() -> Dict[str, Any]:
     Returns:
         Dict with cleanup status
     """
-    try:
-        # Check if user has permission
-        if "System Manager" not in frappe.get_roles():
-            return {
-                "success": False,
-                "error": "Insufficient permissions. System Manager role required."
-            }
-
-        result = TestSimulationManager.cleanup_all_test_data()
-        return result
-
-    except Exception as e:
-        frappe.log_error(f"Error cleaning up all test data: {str(e)}", "Test Simulation API")
+    # Check if user has permission
+    if "System Manager" not in frappe.get_roles():
         return {
             "success": False,
-            "error": str(e)
+            "error": "Insufficient permissions. System Manager role required."
         }
 
+    result = TestSimulationManager.cleanup_all_test_data()
+    return result
+
 @frappe.whitelist()
+@_api_endpoint("getting active test sessions")
 def get_active_test_sessions() -> Dict[str, Any]:
     """
     Get all active test sessions for current user
@@ -228,24 +241,17 @@ def get_active_test_sessions() -> Dict[str, Any]:
     Returns:
         Dict with list of active sessions
     """
-    try:
-        manager = TestSimulationManager()
-        sessions = manager.get_active_test_sessions()
+    manager = TestSimulationManager()
+    sessions = manager.get_active_test_sessions()
 
-        return {
-            "success": True,
-            "sessions": sessions,
-            "count": len(sessions)
-        }
-
-    except Exception as e:
-        frappe.log_error(f"Error getting active test sessions: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    return {
+        "success": True,
+        "sessions": sessions,
+        "count": len(sessions)
+    }
 
 @frappe.whitelist()
+@_api_endpoint("getting test customers")
 def get_test_customers(session_id: str = None) -> Dict[str, Any]:
     """
     Get all test customers for a session or all test customers
@@ -256,33 +262,27 @@ def get_test_customers(session_id: str = None) -> Dict[str, Any]:
     Returns:
         Dict with list of test customers
     """
-    try:
-        filters = {"is_test_customer": 1}
-        if session_id:
-            filters["test_session_id"] = session_id
-
-        customers = frappe.get_all(
-            "Contact",
-            filters=filters,
-            fields=["name", "full_name", "first_name", "last_name", "email_id",
-                   "mobile_no", "test_session_id", "creation", "test_created_by"],
-            order_by="creation DESC"
-        )
-
-        return {
-            "success": True,
-            "customers": customers,
-            "count": len(customers)
-        }
-
-    except Exception as e:
-        frappe.log_error(f"Error getting test customers: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    filters = {"is_test_customer": 1}
+    if session_id:
+        filters["test_session_id"] = session_id
+
+    # Served by the (is_test_customer, test_session_id, creation) index on Contact
+    customers = frappe.get_all(
+        "Contact",
+        filters=filters,
+        fields=["name", "full_name", "first_name", "last_name", "email_id",
+               "mobile_no", "test_session_id", "creation", "test_created_by"],
+        order_by="creation DESC"
+    )
+
+    return {
+        "success": True,
+        "customers": customers,
+        "count": len(customers)
+    }
 
 @frappe.whitelist()
+@_api_endpoint("simulating customer message")
 def simulate_customer_message(
     customer_type: str,
     customer_data: Dict[str, Any] = None,
@@ -301,49 +301,41 @@ def simulate_customer_message(
     Returns:
         Dict with customer and message details
     """
-    try:
-        manager = TestSimulationManager(session_id=session_id)
+    manager = _get_manager(session_id)
 
-        # Handle customer creation or selection
-        if customer_type == "new":
-            if not customer_data:
-                return {
-                    "success": False,
-                    "error": "Customer data required for new customer"
-                }
-
-            # Create new test customer
-            customer_result = manager.create_test_customer(customer_data)
-            if not customer_result.get("success"):
-                return customer_result
-
-            customer_id = customer_result["customer_id"]
-        else:
-            # Use existing customer
-            customer_id = customer_data.get("customer_id") if customer_data else None
-            if not customer_id:
-                return {
-                    "success": False,
-                    "error": "Customer ID required for existing customer"
-                }
+    # Handle customer creation or selection
+    if customer_type == "new":
+        if not customer_data:
+            return {
+                "success": False,
+                "error": "Customer data required for new customer"
+            }
 
-        # Send message if provided
-        message_result = None
-        if message:
-            message_result = manager.send_test_message(customer_id, message)
+        # Create new test customer
+        customer_result = manager.create_test_customer(customer_data)
+        if not customer_result.get("success"):
+            return customer_result
 
-        return {
-            "success": True,
-            "session_id": manager.session_id,
-            "customer_id": customer_id,
-            "customer_type": customer_type,
-            "message_sent": message_result is not None,
-            "message_result": message_result
-        }
+        customer_id = customer_result["customer_id"]
+    else:
+        # Use existing customer
+        customer_id = customer_data.get("customer_id") if customer_data else None
+        if not customer_id:
+            return {
+                "success": False,
+                "error": "Customer ID required for existing customer"
+            }
 
-    except Exception as e:
-        frappe.log_error(f"Error simulating customer message: {str(e)}", "Test Simulation API")
-        return {
-            "success": False,
-            "error": str(e)
-        }
\ No newline at end of file
+    # Send message if provided
+    message_result = None
+    if message:
+        message_result = manager.send_test_message(customer_id, message)
+
+    return {
+        "success": True,
+        "session_id": manager.session_id,
+        "customer_id": customer_id,
+        "customer_type": customer_type,
+        "message_sent": message_result is not None,
+        "message_result": message_result
+    }
@@ -5,10 +5,67 @@ Handles creation and management of test customers, messages, and conversations
 
 import frappe
 import json
-from datetime import datetime
-import uuid
+from frappe.query_builder import Order
+from frappe.query_builder.functions import Count, Min
+import secrets
+import time
 from typing import Dict, Any, List, Optional
 
+from crm.utils import bulk_delete_docs
+
+try:
+    from frappe_whatsapp.utils.webhook import process_messages
+except ImportError:
+    # frappe_whatsapp is optional; without it test messages cannot be processed
+    process_messages = None
+
+# Test data cleaned up per session: (key in the cleanup result, doctype, test flag field),
+# in deletion order
+TEST_DOCTYPES = (
+    ("communications", "Communication", "is_test_message"),
+    ("stories", "Story", "is_test_story"),
+    ("trips", "Trip", "is_test_trip"),
+    ("contacts", "Contact", "is_test_customer"),
+)
+
+# Documents deleted per transaction when cleaning up test data across all sessions
+CLEANUP_CHUNK_SIZE = 10000
+
+CONVERSATION_FIELDS = [
+    "name", "sender", "sender_full_name", "recipients", "content", "communication_type",
+    "communication_medium", "sent_or_received", "reference_doctype", "reference_name", "creation"
+]
+
+
+def _next_test_phone() -> str:
+    """
+    Generate a unique 10-digit test phone number starting with 9, from a site-wide counter
+    so concurrent tests never collide the way second-resolution timestamps could
+    """
+    cache = frappe.cache()
+    key = cache.make_key("test_simulation_phone_seq")
+    if cache.get(key) is None:
+        # The counter lives in the cache, so after a flush it restarts from the highest number
+        # still held by a test contact; NX keeps concurrent seeders from moving it back
+        cache.set(key, _max_test_phone_seq(), nx=True)
+    seq = cache.incr(key) % 1_000_000_000
+    return f"9{seq:09d}"
+
+
+def _max_test_phone_seq() -> int:
+    """Returns the highest counter value used by an existing test contact's generated phone"""
+    return frappe.db.sql(
+        """
+        SELECT COALESCE(MAX(CAST(SUBSTRING(cp.phone, 2) AS UNSIGNED)), 0)
+        FROM `tabContact Phone` cp
+        JOIN `tabContact` c ON c.name = cp.parent
+        WHERE cp.parenttype = 'Contact'
+            AND c.is_test_customer = 1
+            AND cp.phone REGEXP '^9[0-9]{9}$'
+        """
+    )[0][0]
+
+
 class TestSimulationManager:
     """
     Manager class for handling test simulations of customer interactions
@@ -27,13 +84,13 @@ class TestSimulationManager:
     @staticmethod
     def generate_session_id() -> str:
         """Generate a unique session ID for test tracking"""
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        unique_id = str(uuid.uuid4())[:8]
-        return f"TEST_{timestamp}_{unique_id}"
+        return f"TEST_{time.strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(4)}"
 
     def create_test_customer(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Create a test customer (Contact) with test flags
+        Create a test customer (Contact) with test flags. If this session already has a test
+        customer with the same name (and the same phone, when one is given), that customer is
+        returned instead of creating a duplicate
 
         Args:
             customer_data: Dictionary containing customer details
@@ -49,10 +106,12 @@ class TestSimulationManager:
             # Prepare test customer name with TEST prefix
             test_name = f"TEST_{customer_data.get('name', 'Customer')}"
 
-            # Generate a unique 10-digit test phone number starting with 9
-            # Format: 9XXYYYYYYY where XX is random 2 digits and YYYYYYY is timestamp-based
-            import random
-            test_phone = customer_data.get('phone', f"9{random.randint(10, 99)}{datetime.now().strftime('%H%M%S')}")
+            existing = self._find_test_customer(test_name, customer_data.get('phone'))
+            if existing:
+                return existing
+
+            # Use the given phone number or generate a unique test one
+            test_phone = customer_data.get('phone') or _next_test_phone()
 
             # Create Contact document with test flags
             contact = frappe.get_doc({
@@ -80,10 +139,10 @@ class TestSimulationManager:
                 })
 
             contact.insert(ignore_permissions=True)
-            frappe.db.commit()
 
-            # Also create a Story for this test customer
+            # Also create a Story for this test customer, then commit both together
             self._create_test_story(contact.name)
+            frappe.db.commit()
 
             return {
                 "success": True,
@@ -101,25 +160,58 @@ class TestSimulationManager:
                 "error": str(e)
             }
 
+    def _find_test_customer(self, test_name: str, phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a test customer already created in this session, e.g. by a repeated auto-create
+
+        Args:
+            test_name: Full name of the test customer, TEST prefix included
+            phone: Phone number the customer must have, if given
+
+        Returns:
+            Dict shaped like the create_test_customer result, or None if there is no match
+        """
+        contact = frappe.db.get_value(
+            "Contact",
+            {"is_test_customer": 1, "test_session_id": self.session_id, "full_name": test_name},
+            ["name", "email_id"],
+            as_dict=True
+        )
+        if not contact:
+            return None
+
+        contact_phone = frappe.db.get_value(
+            "Contact Phone",
+            {"parent": contact.name, "parenttype": "Contact", "parentfield": "phone_nos"},
+            "phone",
+            order_by="is_primary_phone desc, idx asc"
+        )
+        if phone and phone != contact_phone:
+            return None
+
+        return {
+            "success": True,
+            "customer_id": contact.name,
+            "customer_name": test_name,
+            "email": contact.email_id,
+            "phone": contact_phone,
+            "session_id": self.session_id
+        }
+
     def _create_test_story(self, contact_name: str) -> None:
         """
-        Create a test Story for the test customer
+        Create a test Story for the test customer. Does not commit; a failure rolls back
+        only the Story so the Contact created alongside it is kept
 
         Args:
             contact_name: Name of the Contact document
         """
+        frappe.db.savepoint("test_story")
         try:
-            # Check if story already exists for this contact
-            if frappe.db.exists("Story", contact_name):
-                # Update existing story with test flags
-                story = frappe.get_doc("Story", contact_name)
-                story.is_test_story = 1
-                story.test_session_id = self.session_id
-                story.test_created_by = self.user
-                story.save(ignore_permissions=True)
-            else:
-                # Create new story with test flags
-                story = frappe.get_doc({
+            # The contact was normally just created, so insert first and treat an existing
+            # story as the exception; this skips the exists() round-trip and cannot race
+            try:
+                frappe.get_doc({
                     "doctype": "Story",
                     "contact": contact_name,
                     "is_test_story": 1,
@@ -127,12 +219,18 @@ class TestSimulationManager:
                     "test_created_by": self.user,
                     "customer_stage": "welcome",
                     "story_version": "1.0"
+                }).insert(ignore_permissions=True)
+            except frappe.DuplicateEntryError:
+                # Update existing story with test flags
+                frappe.db.rollback(save_point="test_story")
+                frappe.db.set_value("Story", contact_name, {
+                    "is_test_story": 1,
+                    "test_session_id": self.session_id,
+                    "test_created_by": self.user
                 })
-                story.insert(ignore_permissions=True)
-
-            frappe.db.commit()
 
         except Exception as e:
+            frappe.db.rollback(save_point="test_story")
             frappe.log_error(f"Error creating test story: {str(e)}", "Test Simulation Manager")
 
     def send_test_message(self, customer_id: str, message: str, channel: str = "WhatsApp") -> Dict[str, Any]:
@@ -148,28 +246,29 @@ class TestSimulationManager:
             Dict with message sending status
         """
         try:
-            # Get customer details
-            contact = frappe.get_doc("Contact", customer_id)
-
-            # Get phone number from child table
-            phone_number = None
-            if contact.phone_nos:
-                for phone in contact.phone_nos:
-                    if phone.is_primary_phone:
-                        phone_number = phone.phone
-                        break
-                if not phone_number and contact.phone_nos:
-                    phone_number = contact.phone_nos[0].phone
+            # Get customer details; only the name fields and one phone number are needed, so the
+            # Contact and its child tables are not loaded as a document
+            contact = frappe.db.get_value("Contact", customer_id, ["full_name", "first_name"], as_dict=True)
+            if not contact:
+                frappe.throw(f"Contact {customer_id} not found", frappe.DoesNotExistError)
+
+            # Get phone number from child table, preferring the primary one
+            phone_number = frappe.db.get_value(
+                "Contact Phone",
+                {"parent": customer_id, "parenttype": "Contact", "parentfield": "phone_nos"},
+                "phone",
+                order_by="is_primary_phone desc, idx asc"
+            )
 
             # If contact doesn't have a phone number, create a test one
             if not phone_number:
-                import random
-                test_phone = f"9{random.randint(10, 99)}{datetime.now().strftime('%H%M%S')}"
-                contact.append("phone_nos", {
+                test_phone = _next_test_phone()
+                contact_doc = frappe.get_doc("Contact", customer_id)
+                contact_doc.append("phone_nos", {
                     "phone": test_phone,
                     "is_primary_phone": 1
                 })
-                contact.save(ignore_permissions=True)
+                contact_doc.save(ignore_permissions=True)
                 frappe.db.commit()
                 phone_number = test_phone
 
@@ -197,24 +296,29 @@ class TestSimulationManager:
         Trigger WhatsApp webhook processing for test message
 
         Args:
-            contact: Contact document
+            contact: Contact name fields (full_name, first_name)
             message: Message text
             phone_number: Phone number to use for the test message
 
         Returns:
             Dict with processing result
         """
-        try:
-            # Import WhatsApp webhook handler
-            from frappe_whatsapp.utils.webhook import process_messages
+        if process_messages is None:
+            # If WhatsApp module not available, just log
+            frappe.log_error("WhatsApp module not available for test processing", "Test Simulation Manager")
+            return {
+                "success": False,
+                "error": "WhatsApp module not available"
+            }
 
-            # Generate a unique test message ID
-            test_message_id = f"TEST_MSG_{self.session_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        try:
+            # Generate a unique test message ID; one clock read gives both it and the timestamp
+            now_ns = time.time_ns()
+            test_message_id = f"TEST_MSG_{self.session_id}_{now_ns}"
 
             # Use provided phone number or generate a test one
             if not phone_number:
-                import random
-                phone_number = f"9{random.randint(10, 99)}{datetime.now().strftime('%H%M%S')}"
+                phone_number = _next_test_phone()
 
             # Clean phone number (remove any + prefix if present)
             clean_phone = phone_number.replace('+', '')
@@ -224,7 +328,7 @@ class TestSimulationManager:
                 "messages": [{
                     "from": clean_phone,
                     "id": test_message_id,
-                    "timestamp": str(int(datetime.now().timestamp())),
+                    "timestamp": str(now_ns // 1_000_000_000),
                     "text": {
                         "body": message
                     },
@@ -242,21 +346,23 @@ class TestSimulationManager:
                 "test_created_by": self.user
             }
 
-            # Process through webhook handler
-            process_messages(test_payload)
+            # Process through webhook handler in the background; it may run the agent and write
+            # several documents, so the request returns as soon as the message is queued
+            frappe.enqueue(
+                "crm.api.test_simulation_manager.process_test_payload",
+                queue="short",
+                job_id=test_message_id,
+                enqueue_after_commit=True,
+                now=frappe.flags.in_test,
+                payload=test_payload
+            )
 
             return {
                 "success": True,
-                "test_message_id": test_message_id
+                "test_message_id": test_message_id,
+                "queued": True
             }
 
-        except ImportError:
-            # If WhatsApp module not available, just log
-            frappe.log_error("WhatsApp module not available for test processing", "Test Simulation Manager")
-            return {
-                "success": False,
-                "error": "WhatsApp module not available"
-            }
         except Exception as e:
             frappe.log_error(f"Error triggering WhatsApp processing: {str(e)}", "Test Simulation Manager")
             return {
@@ -285,10 +391,12 @@ class TestSimulationManager:
                 filters["reference_name"] = customer_id
                 filters["reference_doctype"] = "Contact"
 
+            # Only the columns a chat view renders; Communication is wide and mostly unused here.
+            # The (is_test_message, test_session_id, creation) index serves the newest-first limit
             communications = frappe.get_all(
                 "Communication",
                 filters=filters,
-                fields=["*"],
+                fields=CONVERSATION_FIELDS,
                 order_by="creation DESC",
                 limit=limit
             )
@@ -310,61 +418,17 @@ class TestSimulationManager:
             Dict with cleanup status
         """
         try:
-            # Delete test Communications
-            comm_count = frappe.db.count("Communication", {
-                "is_test_message": 1,
-                "test_session_id": self.session_id
-            })
-
-            frappe.db.delete("Communication", {
-                "is_test_message": 1,
-                "test_session_id": self.session_id
-            })
-
-            # Delete test Stories
-            story_count = frappe.db.count("Story", {
-                "is_test_story": 1,
-                "test_session_id": self.session_id
-            })
-
-            frappe.db.delete("Story", {
-                "is_test_story": 1,
-                "test_session_id": self.session_id
-            })
-
-            # Delete test Trips
-            trip_count = frappe.db.count("Trip", {
-                "is_test_trip": 1,
-                "test_session_id": self.session_id
-            })
-
-            frappe.db.delete("Trip", {
-                "is_test_trip": 1,
-                "test_session_id": self.session_id
-            })
-
-            # Delete test Contacts
-            contact_count = frappe.db.count("Contact", {
-                "is_test_customer": 1,
-                "test_session_id": self.session_id
-            })
-
-            frappe.db.delete("Contact", {
-                "is_test_customer": 1,
-                "test_session_id": self.session_id
-            })
+            deleted = {
+                key: self._delete_docs(doctype, {flag: 1, "test_session_id": self.session_id})
+                for key, doctype, flag in TEST_DOCTYPES
+            }
 
             frappe.db.commit()
 
             return {
                 "success": True,
                 "session_id": self.session_id,
-                "deleted": {
-                    "communications": comm_count,
-                    "stories": story_count,
-                    "trips": trip_count,
-                    "contacts": contact_count
-                }
+                "deleted": deleted
             }
 
         except Exception as e:
@@ -374,6 +438,35 @@ class TestSimulationManager:
                 "error": str(e)
             }
 
+    @staticmethod
+    def _delete_docs(doctype: str, filters: Dict[str, Any], chunk_size: Optional[int] = None) -> int:
+        """
+        Delete matching documents with one DELETE per table, child rows included
+
+        Args:
+            doctype: DocType to delete from
+            filters: Filters selecting the documents
+            chunk_size: If set, delete and commit this many documents at a time, so a large
+                cleanup never holds one huge transaction or loads every name at once
+
+        Returns:
+            Number of documents deleted
+        """
+        deleted = 0
+        while True:
+            names = frappe.get_all(doctype, filters=filters, pluck="name", limit=chunk_size or 0)
+            if not names:
+                break
+
+            bulk_delete_docs(doctype, names)
+            deleted += len(names)
+
+            if not chunk_size or len(names) < chunk_size:
+                break
+            frappe.db.commit()
+
+        return deleted
+
     @staticmethod
     def cleanup_all_test_data() -> Dict[str, Any]:
         """
@@ -383,32 +476,16 @@ class TestSimulationManager:
             Dict with cleanup status
         """
         try:
-            # Delete all test Communications
-            comm_count = frappe.db.count("Communication", {"is_test_message": 1})
-            frappe.db.delete("Communication", {"is_test_message": 1})
-
-            # Delete all test Stories
-            story_count = frappe.db.count("Story", {"is_test_story": 1})
-            frappe.db.delete("Story", {"is_test_story": 1})
-
-            # Delete all test Trips
-            trip_count = frappe.db.count("Trip", {"is_test_trip": 1})
-            frappe.db.delete("Trip", {"is_test_trip": 1})
-
-            # Delete all test Contacts
-            contact_count = frappe.db.count("Contact", {"is_test_customer": 1})
-            frappe.db.delete("Contact", {"is_test_customer": 1})
+            deleted = {
+                key: TestSimulationManager._delete_docs(doctype, {flag: 1}, chunk_size=CLEANUP_CHUNK_SIZE)
+                for key, doctype, flag in TEST_DOCTYPES
+            }
 
             frappe.db.commit()
 
             return {
                 "success": True,
-                "deleted": {
-                    "communications": comm_count,
-                    "stories": story_count,
-                    "trips": trip_count,
-                    "contacts": contact_count
-                }
+                "deleted": deleted
             }
 
         except Exception as e:
@@ -426,21 +503,49 @@ class TestSimulationManager:
             List of active test sessions
         """
         try:
-            # Get unique test sessions
-            sessions = frappe.db.sql("""
-                SELECT DISTINCT
-                    test_session_id,
-                    MIN(creation) as started_at,
-                    COUNT(*) as message_count
-                FROM tabCommunication
-                WHERE is_test_message = 1
-                    AND test_created_by = %s
-                GROUP BY test_session_id
-                ORDER BY MIN(creation) DESC
-            """, (self.user,), as_dict=True)
+            # Get unique test sessions; served by the (test_created_by, is_test_message,
+            # test_session_id) index on Communication
+            Communication = frappe.qb.DocType("Communication")
+            sessions = (
+                frappe.qb.from_(Communication)
+                .select(
+                    Communication.test_session_id,
+                    Min(Communication.creation).as_("started_at"),
+                    Count("*").as_("message_count")
+                )
+                .where(
+                    (Communication.is_test_message == 1)
+                    & (Communication.test_created_by == self.user)
+                )
+                .groupby(Communication.test_session_id)
+                .orderby(Min(Communication.creation), order=Order.desc)
+            ).run(as_dict=True)
 
             return sessions
 
         except Exception as e:
             frappe.log_error(f"Error getting active test sessions: {str(e)}", "Test Simulation Manager")
-            return []
\ No newline at end of file
+            return []
+
+
+def process_test_payload(payload: Dict[str, Any]) -> None:
+    """
+    Background job that runs a simulated WhatsApp payload through the webhook handler and
+    tells the test UI the message was processed
+
+    Args:
+        payload: Webhook payload built by TestSimulationManager._trigger_whatsapp_webhook
+    """
+    event = {"test_message_id": payload["messages"][0]["id"], "test_session_id": payload["test_session_id"]}
+
+    try:
+        process_messages(payload)
+        event["success"] = True
+    except Exception as e:
+        # Drop the handler's partial writes, keep the error log, and still tell the UI so it
+        # does not wait for the message forever
+        frappe.db.rollback()
+        frappe.log_error(title=f"Test message processing failed: {event['test_message_id']}")
+        event.update({"success": False, "error": str(e)})
+
+    frappe.publish_realtime("test_message_processed", event, user=payload["test_created_by"])
@@ -11,6 +11,7 @@ from crm.fcrm.doctype.crm_service_level_agreement.utils import get_sla
 from crm.fcrm.doctype.crm_status_change_log.crm_status_change_log import (
 	add_status_change_log,
 )
+from crm.utils import get_all_with_children
 
 
 class CRMLead(Document):
@@ -543,26 +544,10 @@ class CRMLead(Document):
 		if not lead_names:
 			return data
 		
-		# Fetch Trip names for all leads first
-		trip_names = frappe.get_all(
-			"Trip",
-			filters={"lead": ["in", lead_names]},
-			fields=["name", "lead"]
-		)
-		
-		# Create a mapping of lead_name -> trip_data with ALL fields
+		# Fetch complete Trip data with ALL fields for all leads at once
 		trip_map = {}
-		for trip_info in trip_names:
-			lead_name = trip_info.get("lead")
-			trip_name = trip_info.get("name")
-			
-			# Get complete Trip document with all fields
-			trip_doc = frappe.get_doc("Trip", trip_name)
-			trip_data = trip_doc.as_dict()
-			
-			if lead_name not in trip_map:
-				trip_map[lead_name] = []
-			trip_map[lead_name].append(trip_data)
+		for trip_data in get_all_with_children("Trip", {"lead": ["in", lead_names]}):
+			trip_map.setdefault(trip_data.get("lead"), []).append(trip_data)
 		
 		# Add trip data to each lead
 		for row in data:
@@ -182,6 +182,8 @@ doc_events = {
 		],
 	},
 	"CRM Lead": {
+		"on_update": ["crm.api.lead_with_requirements.clear_list_cache"],
+		"on_trash": ["crm.api.lead_with_requirements.clear_list_cache"],
 		# TEMPORARILY DISABLED - CAUSING INFINITE RECURSION
 		# "on_update": ["crm.api.lead_sync.sync_lead_to_contact"],
 		# "on_change": ["crm.api.lead_sync.sync_lead_to_contact"],
@@ -190,6 +192,26 @@ doc_events = {
 		"before_validate": ["crm.api.demo.validate_user"],
 		"validate_reset_password": ["crm.api.demo.validate_reset_password"],
 	},
+	"Hotel": {
+		"on_update": ["crm.api.itinerary_generator.clear_service_cache"],
+		"on_trash": ["crm.api.itinerary_generator.clear_service_cache"],
+	},
+	"Activity": {
+		"on_update": ["crm.api.itinerary_generator.clear_service_cache"],
+		"on_trash": ["crm.api.itinerary_generator.clear_service_cache"],
+	},
+	"Meal": {
+		"on_update": ["crm.api.itinerary_generator.clear_service_cache"],
+		"on_trash": ["crm.api.itinerary_generator.clear_service_cache"],
+	},
+	"Transportation": {
+		"on_update": ["crm.api.itinerary_generator.clear_service_cache"],
+		"on_trash": ["crm.api.itinerary_generator.clear_service_cache"],
+	},
+	"Transfer": {
+		"on_update": ["crm.api.itinerary_generator.clear_service_cache"],
+		"on_trash": ["crm.api.itinerary_generator.clear_service_cache"],
+	},
 }
 
 # Scheduled Tasks
@@ -282,7 +304,10 @@ doc_events = {
 # "crm.auth.validate"
 # ]
 
-after_migrate = ["crm.fcrm.doctype.fcrm_settings.fcrm_settings.after_migrate"]
+after_migrate = [
+	"crm.fcrm.doctype.fcrm_settings.fcrm_settings.after_migrate",
+	"crm.install.add_test_simulation_indexes",
+]
 
 standard_dropdown_items = [
 	{
@@ -256,6 +256,23 @@ def add_email_template_custom_fields():
 		frappe.clear_cache(doctype="Email Template")
 
 
+# Indexes for the test simulation queries: (doctype, index name, columns). The columns are
+# custom fields that may be added after install, so the indexes are also ensured after migrate
+TEST_SIMULATION_INDEXES = (
+	("Communication", "test_session_index", ["test_created_by", "is_test_message", "test_session_id"]),
+	("Communication", "test_conversation_index", ["is_test_message", "test_session_id", "creation"]),
+	("Contact", "test_customer_index", ["is_test_customer", "test_session_id", "creation"]),
+)
+
+
+def add_test_simulation_indexes():
+	for doctype, index_name, columns in TEST_SIMULATION_INDEXES:
+		# Sites without the test simulation fields have nothing to index yet; add_index skips
+		# indexes that already exist
+		if all(frappe.db.has_column(doctype, column) for column in columns):
+			frappe.db.add_index(doctype, columns, index_name=index_name)
+
+
 def add_default_industries():
 	industries = [
 		"Accounting",
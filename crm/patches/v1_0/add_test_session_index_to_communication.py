@@ -0,0 +1,6 @@
+from crm.install import add_test_simulation_indexes
+
+
+def execute():
+	# Sites that get the test simulation fields later are covered by the after_migrate hook
+	add_test_simulation_indexes()
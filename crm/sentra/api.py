@@ -6,6 +6,8 @@ from frappe import _
 from frappe.utils import validate_email_address
 import json
 
+import orjson
+
 
 # ========== ACTIVITY APIs ==========
 
@@ -98,7 +100,7 @@ def create_activity(activity_data):
 	"""
 	try:
 		if isinstance(activity_data, str):
-			activity_data = json.loads(activity_data)
+			activity_data = orjson.loads(activity_data)
 		
 		# Validate required fields
 		required_fields = ["activity_name", "activity_code", "activity_type", "city", "currency", "pricing_type"]
@@ -138,7 +140,7 @@ def update_activity(name, activity_data):
 	"""
 	try:
 		if isinstance(activity_data, str):
-			activity_data = json.loads(activity_data)
+			activity_data = orjson.loads(activity_data)
 		
 		if not frappe.db.exists("Activity", name):
 			frappe.throw(_("Activity not found"))
@@ -467,7 +469,7 @@ def create_dmc(dmc_data):
 	"""
 	try:
 		if isinstance(dmc_data, str):
-			dmc_data = json.loads(dmc_data)
+			dmc_data = orjson.loads(dmc_data)
 		
 		# Validate required fields
 		required_fields = ["company_name", "dmc_code", "city", "country", "address_line_1"]
@@ -511,7 +513,7 @@ def update_dmc(name, dmc_data):
 	"""
 	try:
 		if isinstance(dmc_data, str):
-			dmc_data = json.loads(dmc_data)
+			dmc_data = orjson.loads(dmc_data)
 		
 		if not frappe.db.exists("DMC", name):
 			frappe.throw(_("DMC not found"))
@@ -838,20 +840,36 @@ def create_trip_with_destinations(doc):
 	"""
 	Create a Trip with auto-creation of destinations if they don't exist
 	"""
-	import json
-	
 	# Parse the doc if it's a string
 	if isinstance(doc, str):
-		doc = json.loads(doc)
+		doc = orjson.loads(doc)
 	
 	# Auto-create destinations first
-	if doc.get('destination_city'):
-		for destination_row in doc['destination_city']:
-			destination_name = destination_row.get('destination', '').strip()
+	destination_rows = [
+		row for row in doc.get('destination_city') or [] if row.get('destination', '').strip()
+	]
+	if destination_rows:
+		# Resolve every row with one query. Each row keeps its own LIKE, so matching follows the
+		# column collation exactly as a lookup per row would
+		destination_names = [row['destination'].strip() for row in destination_rows]
+		matches = dict(frappe.db.sql(
+			" UNION ALL ".join(
+				f"(SELECT {index} AS row_index, name FROM `tabDestination` WHERE city LIKE %s "
+				"ORDER BY modified DESC LIMIT 1)"
+				for index in range(len(destination_names))
+			),
+			[f"%{destination_name}%" for destination_name in destination_names],
+		))
+		
+		created = False
+		for index, destination_row in enumerate(destination_rows):
+			destination_name = destination_names[index]
 			if destination_name:
-				# Check if destination exists (case-insensitive)
-				existing_destination = frappe.db.get_value("Destination", 
-					{"city": ["like", f"%{destination_name}%"]}, "name")
+				existing_destination = matches.get(index)
+				if not existing_destination and created:
+					# A destination created for an earlier row may match this one
+					existing_destination = frappe.db.get_value("Destination",
+						{"city": ["like", f"%{destination_name}%"]}, "name")
 				
 				if not existing_destination:
 					# Auto-create the destination
@@ -861,6 +879,7 @@ def create_trip_with_destinations(doc):
 					try:
 						new_destination.insert(ignore_permissions=True)
 						destination_row['destination'] = new_destination.name
+						created = True
 						frappe.logger().info(f"Auto-created destination: {new_destination.name}")
 					except Exception as e:
 						frappe.logger().error(f"Failed to create destination {destination_name}: {str(e)}")
@@ -882,11 +901,9 @@ def insert_trip_ignore_links(doc):
 	Create a Trip using ignore_links=True to bypass destination validation
 	Note: This will create the trip even if destinations don't exist
 	"""
-	import json
-	
 	# Parse the doc if it's a string
 	if isinstance(doc, str):
-		doc = json.loads(doc)
+		doc = orjson.loads(doc)
 	
 	# Create the Trip with link validation disabled
 	trip = frappe.new_doc("Trip")
@@ -996,7 +1013,7 @@ def create_package(package_data):
 	"""
 	try:
 		if isinstance(package_data, str):
-			package_data = json.loads(package_data)
+			package_data = orjson.loads(package_data)
 		
 		# Validate required fields
 		required_fields = ["package_name", "package_code", "dmc", "valid_from", "valid_to", 
@@ -1053,7 +1070,7 @@ def update_package(name, package_data):
 	"""
 	try:
 		if isinstance(package_data, str):
-			package_data = json.loads(package_data)
+			package_data = orjson.loads(package_data)
 		
 		if not frappe.db.exists("Standard Package", name):
 			frappe.throw(_("Package not found"))
@@ -12,21 +12,36 @@ class Trip(Document):
 		# Auto-create destinations first
 		try:
 			if hasattr(self, 'destination_city') and self.destination_city:
-				for destination_row in self.destination_city:
-					if hasattr(destination_row, 'destination') and destination_row.destination:
-						destination_name = str(destination_row.destination).strip()
-						if destination_name:
-							# Check if destination exists
-							if not frappe.db.exists("Destination", destination_name):
-								# Create new destination using Document API
-								dest_doc = frappe.get_doc({
-									'doctype': 'Destination',
-									'city': destination_name.title(),
-									'country': 'Unknown'
-								})
-								dest_doc.insert(ignore_permissions=True)
-								# Update the reference to the created destination
-								destination_row.destination = dest_doc.name
+				destination_rows = [
+					row for row in self.destination_city
+					if getattr(row, 'destination', None) and str(row.destination).strip()
+				]
+				
+				# Check which destinations exist with one query; names compare case-insensitively like the database
+				existing = {
+					name.lower() for name in frappe.get_all(
+						"Destination",
+						filters={"name": ["in", list({str(row.destination).strip() for row in destination_rows})]},
+						pluck="name"
+					)
+				} if destination_rows else set()
+				
+				created = {}
+				for destination_row in destination_rows:
+					destination_name = str(destination_row.destination).strip()
+					if destination_name.lower() in existing:
+						continue
+					if destination_name.lower() not in created:
+						# Create new destination using Document API
+						dest_doc = frappe.get_doc({
+							'doctype': 'Destination',
+							'city': destination_name.title(),
+							'country': 'Unknown'
+						})
+						dest_doc.insert(ignore_permissions=True)
+						created[destination_name.lower()] = dest_doc.name
+					# Update the reference to the created destination
+					destination_row.destination = created[destination_name.lower()]
 		except Exception as e:
 			frappe.log_error(f"Error auto-creating destinations: {str(e)}")
 		
@@ -1,5 +1,14 @@
+import csv
+import functools
+import inspect
+import io
+
+import frappe
+import orjson
 import phonenumbers
-from frappe.utils import floor
+from frappe import _
+from frappe.model.document import bulk_insert
+from frappe.utils import cstr, floor, strip_html
 from phonenumbers import NumberParseException
 from phonenumbers import PhoneNumberFormat as PNF
 
@@ -93,3 +102,253 @@ def seconds_to_duration(seconds):
 		return f"{seconds}s"
 	else:
 		return "0s"
+
+
+def bulk_insert_child_rows(parent_doc, fieldname, rows):
+	"""
+	Writes child rows (dicts) of an already saved parent with a single INSERT and returns
+	them as documents. Child validations and hooks do not run.
+	"""
+	if not rows:
+		return []
+
+	child_doctype = parent_doc.meta.get_field(fieldname).options
+	children = []
+	for idx, row in enumerate(rows, start=1):
+		child = frappe.new_doc(child_doctype, parent_doc=parent_doc, parentfield=fieldname)
+		child.update(row)
+		child.update(
+			{
+				"name": frappe.generate_hash(length=10),
+				"owner": parent_doc.owner,
+				"creation": parent_doc.creation,
+				"modified": parent_doc.modified,
+				"modified_by": parent_doc.modified_by,
+				"parent": parent_doc.name,
+				"parenttype": parent_doc.doctype,
+				"parentfield": fieldname,
+				"idx": idx,
+			}
+		)
+		children.append(child)
+
+	bulk_insert(child_doctype, children)
+	return children
+
+
+def skip_mandatory_for_tables(doc, table_fieldnames):
+	"""
+	Turns off the mandatory check of doc for child tables whose rows are bulk inserted after
+	the parent is saved. Every other mandatory field is checked here first.
+	"""
+	if not table_fieldnames:
+		return
+
+	missing = [
+		_(df.label or df.fieldname)
+		for df in doc.meta.get("fields", {"reqd": 1})
+		if df.fieldname not in table_fieldnames
+		and (doc.get(df.fieldname) in (None, []) or not strip_html(cstr(doc.get(df.fieldname))).strip())
+	]
+	if missing:
+		frappe.throw(
+			_("Value missing for {0}: {1}").format(_(doc.doctype), ", ".join(missing)),
+			frappe.MandatoryError,
+		)
+
+	doc.flags.ignore_mandatory = True
+
+
+def get_all_with_children(doctype, filters, fields=None):
+	"""
+	Returns the matching documents as dicts (all fields unless `fields` is given), with their
+	child tables filled in like as_dict(), using one query per child table instead of one
+	get_doc per document.
+	"""
+	table_fields = frappe.get_meta(doctype).get_table_fields()
+
+	# Child tables are always filled in, so their fieldnames are not columns to select
+	table_fieldnames = {df.fieldname for df in table_fields}
+	fields = [field for field in fields or ["*"] if field not in table_fieldnames]
+	if "*" not in fields and "name" not in fields:
+		fields.append("name")
+
+	docs = frappe.get_all(doctype, filters=filters, fields=fields)
+	if not docs:
+		return docs
+
+	docs_by_name = {}
+	for doc in docs:
+		doc["doctype"] = doctype
+		docs_by_name[doc.name] = doc
+
+	for df in table_fields:
+		for doc in docs:
+			doc[df.fieldname] = []
+		rows = frappe.get_all(
+			df.options,
+			filters={
+				"parenttype": doctype,
+				"parentfield": df.fieldname,
+				"parent": ["in", list(docs_by_name)],
+			},
+			fields=["*"],
+			order_by="idx asc",
+		)
+		for row in rows:
+			row["doctype"] = df.options
+			docs_by_name[row.parent][df.fieldname].append(row)
+
+	return docs
+
+
+# Rows that delete_doc removes along with a document: (doctype, reference doctype field, reference name field)
+DYNAMIC_LINKS_DELETED = (
+	("ToDo", "reference_type", "reference_name"),
+	("Email Unsubscribe", "reference_doctype", "reference_name"),
+	("DocShare", "share_doctype", "share_name"),
+	("Version", "ref_doctype", "docname"),
+	("Comment", "reference_doctype", "reference_name"),
+	("View Log", "reference_doctype", "reference_name"),
+	("Document Follow", "ref_doctype", "ref_docname"),
+	("Notification Log", "document_type", "document_name"),
+	("Tag Link", "document_type", "document_name"),
+	("Communication Link", "link_doctype", "link_name"),
+)
+
+# Rows that delete_doc keeps but unlinks from the deleted document
+DYNAMIC_LINKS_CLEARED = (
+	("Communication", "reference_doctype", "reference_name"),
+	("Activity Log", "reference_doctype", "reference_name"),
+	("Activity Log", "timeline_doctype", "timeline_name"),
+)
+
+
+def bulk_delete_docs(doctype, names):
+	"""
+	Deletes documents and their child table rows with one DELETE per table, and cleans up
+	what delete_doc would: comments, assignments, versions, shares, tags and other rows
+	pointing at them are deleted, communications are unlinked and attached files are deleted.
+	Controllers, hooks and link checks of the documents themselves do not run.
+	"""
+	if not names:
+		return
+
+	for df in frappe.get_meta(doctype).get_table_fields():
+		frappe.db.delete(df.options, {"parenttype": doctype, "parent": ["in", names]})
+	frappe.db.delete(doctype, {"name": ["in", names]})
+
+	for link_doctype, doctype_field, name_field in DYNAMIC_LINKS_DELETED:
+		frappe.db.delete(link_doctype, {doctype_field: doctype, name_field: ["in", names]})
+	for link_doctype, doctype_field, name_field in DYNAMIC_LINKS_CLEARED:
+		frappe.db.set_value(
+			link_doctype,
+			{doctype_field: doctype, name_field: ["in", names]},
+			{doctype_field: None, name_field: None},
+			update_modified=False,
+		)
+
+	# Files go through delete_doc so they are also removed from disk
+	for file_name in frappe.get_all(
+		"File", filters={"attached_to_doctype": doctype, "attached_to_name": ["in", names]}, pluck="name"
+	):
+		frappe.delete_doc("File", file_name, ignore_permissions=True)
+
+
+def stream_csv_export(doctype, fields, filters=None, page_size=1000):
+	"""Streams a CSV export page by page instead of building the whole file in memory"""
+	from frappe.permissions import can_export
+	from werkzeug.wrappers import Response
+
+	can_export(doctype, raise_exception=True)
+
+	filters = frappe.parse_json(filters) if isinstance(filters, str) else filters
+	if isinstance(filters, dict):
+		filters = [
+			[key, *value] if isinstance(value, (list, tuple)) else [key, "=", value]
+			for key, value in filters.items()
+		]
+
+	response = Response(
+		_generate_csv_rows(frappe.local.site, frappe.session.user, doctype, fields, filters or [], page_size),
+		mimetype="text/csv",
+		direct_passthrough=True,
+	)
+	response.headers["Content-Disposition"] = f'attachment; filename="{frappe.scrub(doctype)}.csv"'
+	return response
+
+
+def _generate_csv_rows(site, user, doctype, fields, filters, page_size):
+	# The response body is consumed after the request context is torn down, so the
+	# generator connects to the site on its own
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user(user)
+
+	try:
+		buffer = io.StringIO()
+		writer = csv.writer(buffer)
+		writer.writerow(fields)
+
+		# name is needed for the page cursor even when it is not exported
+		query_fields = fields if "name" in fields else [*fields, "name"]
+		name_index = query_fields.index("name")
+
+		# Keyset pagination on name keeps every page an index range scan
+		last_name = None
+		while True:
+			page_filters = [*filters, ["name", ">", last_name]] if last_name else filters
+			rows = frappe.get_list(
+				doctype,
+				fields=query_fields,
+				filters=page_filters,
+				order_by="name asc",
+				limit=page_size,
+				as_list=True,
+			)
+			if not rows:
+				break
+
+			writer.writerows(rows if query_fields is fields else (row[:-1] for row in rows))
+			yield buffer.getvalue()
+			buffer.seek(0)
+			buffer.truncate()
+
+			if len(rows) < page_size:
+				break
+			last_name = rows[-1][name_index]
+	finally:
+		frappe.destroy()
+
+
+def parse_json_args(*argnames):
+	"""
+	Decorator for whitelisted methods that decodes the named arguments when they arrive as
+	JSON strings (form-encoded requests), so the method body always receives lists and dicts.
+	Strings that do not start like a JSON array or object, e.g. a single document name, are
+	passed through unchanged.
+	"""
+
+	def decorator(fn):
+		parameters = list(inspect.signature(fn).parameters)
+		positions = {argname: parameters.index(argname) for argname in argnames}
+
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			args = list(args)
+			for argname, position in positions.items():
+				if position < len(args):
+					args[position] = _parse_json_arg(args[position])
+				elif argname in kwargs:
+					kwargs[argname] = _parse_json_arg(kwargs[argname])
+			return fn(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
+
+
+def _parse_json_arg(value):
+	if isinstance(value, str) and value.lstrip()[:1] in ("[", "{"):
+		return orjson.loads(value)
+	return value
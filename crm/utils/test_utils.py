@@ -0,0 +1,101 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from crm.utils import (
+	bulk_delete_docs,
+	bulk_insert_child_rows,
+	get_all_with_children,
+	parse_json_args,
+	skip_mandatory_for_tables,
+)
+
+
+@parse_json_args("fields", "filters")
+def _echo(doctype, fields=None, filters=None):
+	return doctype, fields, filters
+
+
+class UnitTestParseJsonArgs(UnitTestCase):
+	def test_decodes_positional_and_keyword_json(self):
+		self.assertEqual(
+			_echo("CRM Lead", '["name", "status"]', filters='{"status": "New"}'),
+			("CRM Lead", ["name", "status"], {"status": "New"}),
+		)
+
+	def test_passes_decoded_and_plain_values_through(self):
+		self.assertEqual(
+			_echo("CRM Lead", ["name"], {"status": "New"}), ("CRM Lead", ["name"], {"status": "New"})
+		)
+		self.assertEqual(_echo("CRM Lead", "name"), ("CRM Lead", "name", None))
+
+
+class IntegrationTestChildTableHelpers(IntegrationTestCase):
+	def make_contact(self, **kwargs):
+		return frappe.get_doc({"doctype": "Contact", "first_name": "_Test Bulk Helper", **kwargs}).insert()
+
+	def test_bulk_insert_child_rows(self):
+		contact = self.make_contact()
+
+		rows = bulk_insert_child_rows(
+			contact, "phone_nos", [{"phone": "9000000001"}, {"phone": "9000000002"}]
+		)
+
+		self.assertEqual([row.idx for row in rows], [1, 2])
+		self.assertTrue(all(row.parent == contact.name and row.creation == contact.creation for row in rows))
+		self.assertEqual(
+			frappe.get_all(
+				"Contact Phone", filters={"parent": contact.name}, pluck="phone", order_by="idx asc"
+			),
+			["9000000001", "9000000002"],
+		)
+		self.assertEqual(bulk_insert_child_rows(contact, "phone_nos", []), [])
+
+	def test_get_all_with_children(self):
+		contact = self.make_contact(
+			phone_nos=[{"phone": "9000000003"}, {"phone": "9000000004"}],
+			email_ids=[{"email_id": "bulk.helper@example.com"}],
+		)
+
+		(doc,) = get_all_with_children("Contact", {"name": contact.name}, fields=["first_name", "phone_nos"])
+
+		self.assertEqual(doc.name, contact.name)
+		self.assertEqual(doc.first_name, "_Test Bulk Helper")
+		self.assertEqual([row.phone for row in doc.phone_nos], ["9000000003", "9000000004"])
+		self.assertEqual([row.email_id for row in doc.email_ids], ["bulk.helper@example.com"])
+		self.assertEqual(doc.phone_nos[0].doctype, "Contact Phone")
+
+	def test_bulk_delete_docs_removes_child_and_linked_rows(self):
+		contact = self.make_contact(phone_nos=[{"phone": "9000000005"}])
+		contact.add_comment("Comment", "Bulk delete helper")
+		frappe.get_doc(
+			{
+				"doctype": "ToDo",
+				"description": "Bulk delete helper",
+				"reference_type": "Contact",
+				"reference_name": contact.name,
+			}
+		).insert()
+
+		bulk_delete_docs("Contact", [contact.name])
+
+		self.assertFalse(frappe.db.exists("Contact", contact.name))
+		self.assertFalse(frappe.db.exists("Contact Phone", {"parent": contact.name}))
+		self.assertFalse(
+			frappe.db.exists("Comment", {"reference_doctype": "Contact", "reference_name": contact.name})
+		)
+		self.assertFalse(
+			frappe.db.exists("ToDo", {"reference_type": "Contact", "reference_name": contact.name})
+		)
+
+	def test_skip_mandatory_for_tables_checks_other_fields(self):
+		todo = frappe.new_doc("ToDo")
+
+		self.assertRaises(frappe.MandatoryError, skip_mandatory_for_tables, todo, ["unused_table"])
+		self.assertFalse(todo.flags.ignore_mandatory)
+
+		todo.description = "Mandatory helper"
+		skip_mandatory_for_tables(todo, ["unused_table"])
+		self.assertTrue(todo.flags.ignore_mandatory)